@@ -1,12 +1,16 @@
 import argparse
+import csv
 import math
-import re
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Iterable, List, Sequence, Tuple
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Sequence, Tuple
 
-from openpyxl import Workbook, load_workbook
+import numpy as np
+from openpyxl import Workbook
 
-from plot_alpha_detection_quadrants import plot_alpha_detection_quadrants
+from second_lists import binary_sidecar_path, read_second_list
+from xlsx_cache import read_xlsx_columns
 
 
 RESULT_HEADER_MAP = [
@@ -17,7 +21,8 @@ RESULT_HEADER_MAP = [
     ("alpha_minus_beta", "alpha_minus_beta"),
     ("alpha_minus_theta", "alpha_minus_theta"),
 ]
-RESULT_HEADERS = [header for header, _ in RESULT_HEADER_MAP]
+# With a matching tolerance the matched dat second is written after the markers.
+TOLERANCE_RESULT_HEADER_MAP = RESULT_HEADER_MAP[:4] + [("dat 秒數", "dat_second")] + RESULT_HEADER_MAP[4:]
 SECOND_HEADERS = {"second", "seconds", "sec", "time", "秒數", "秒"}
 THETA_POWER_HEADERS = {"theta_power", "thetapower"}
 ALPHA_POWER_HEADERS = {"alpha_power", "alphapower"}
@@ -27,6 +32,39 @@ ALPHA_THETA_HEADERS = {"alpha_theta", "alphatheta"}
 ALPHA_RATIO_HEADERS = {"alpha_ratio", "alpharatio", "alpha_total", "alphatotal"}
 ALPHA_MINUS_BETA_HEADERS = {"alpha_minus_beta", "alphaminusbeta"}
 ALPHA_MINUS_THETA_HEADERS = {"alpha_minus_theta", "alphaminustheta"}
+TABLE_METRICS = ("alpha_beta", "alpha_theta", "alpha_ratio", "alpha_minus_beta", "alpha_minus_theta")
+RESULT_MARKERS = ("true_positive", "false_positive", "miss_positive")
+# Percentiles of the TP + FP alpha_minus values tried as beta/theta thresholds.
+SWEEP_START = 30
+SWEEP_END = 80
+# alpha_beta / alpha_theta must exceed these cutoffs for a second to be positive.
+RATIO_CUTOFF = 1.0
+DEFAULT_SUMMARY_NAME = "alpha_compare_summary.xlsx"
+COUNT_HEADERS = ["true_positive", "false_positive", "miss_positive", "false_positive_rate", "miss_positive_rate", "ratio"]
+SUBJECT_HEADERS = (
+    ["prefix", "folder", "status", "dat_seconds", "eye_dat_seconds"]
+    + [f"baseline_{header}" for header in COUNT_HEADERS]
+    + [f"pooled_{header}" for header in COUNT_HEADERS]
+    + ["loso_percentage", "loso_beta", "loso_theta"]
+    + [f"loso_{header}" for header in COUNT_HEADERS]
+    + ["error"]
+)
+POOLED_HEADERS = ["method", "percentage", "beta", "theta"] + COUNT_HEADERS[:3] + ["total", "accuracy"] + COUNT_HEADERS[3:]
+GRID_HEADERS = [
+    "alpha_beta_cutoff",
+    "alpha_theta_cutoff",
+    "beta",
+    "theta",
+    "true_positive",
+    "false_positive",
+    "miss_positive",
+    "false_positive_rate",
+    "miss_positive_rate",
+    "ratio",
+    "tpr",
+    "fpr",
+    "precision",
+]
 
 
 def parse_args() -> argparse.Namespace:
@@ -49,6 +87,60 @@ def parse_args() -> argparse.Namespace:
         "--plot-output",
         help="Optional output PNG path. Defaults to <prefix>_alpha_detection_quadrants.png in the same folder.",
     )
+    parser.add_argument(
+        "--sweep-step",
+        type=float,
+        default=1.0,
+        help=f"Percentile step of the threshold sweep from {SWEEP_START}%% to {SWEEP_END}%% (default: 1).",
+    )
+    parser.add_argument(
+        "--batch-root",
+        help=(
+            "Evaluate every *_alpha.dat / *_raw_FP2.xlsx pair under this folder (recursively) "
+            "and choose pooled and leave-one-subject-out thresholds."
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for --batch-root (default: number of CPUs).",
+    )
+    parser.add_argument(
+        "--summary-output",
+        help=f"Summary xlsx path for --batch-root. Defaults to <batch-root>/{DEFAULT_SUMMARY_NAME}.",
+    )
+    parser.add_argument(
+        "--grid-search",
+        action="store_true",
+        help=(
+            "Also search independent alpha_minus_beta x alpha_minus_theta thresholds "
+            "and ratio cutoffs; writes <prefix>_alpha_grid_search.csv/.xlsx and a ratio heatmap."
+        ),
+    )
+    parser.add_argument(
+        "--grid-step",
+        type=float,
+        default=1.0,
+        help="Percentile step (1-100%%) of the TP + FP alpha_minus values used as grid thresholds (default: 1).",
+    )
+    parser.add_argument(
+        "--ratio-cutoffs",
+        default=str(RATIO_CUTOFF),
+        help='Comma-separated alpha_beta / alpha_theta cutoffs searched with --grid-search (default: "1").',
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=int,
+        default=0,
+        help="Match a detected second to a .dat second at most this many seconds away, one to one (default: 0).",
+    )
+    parser.add_argument(
+        "--eye-tolerance",
+        type=int,
+        default=None,
+        help="Drop false positives within this many seconds of an eye movement (default: same as --tolerance).",
+    )
     return parser.parse_args()
 
 
@@ -86,27 +178,13 @@ def build_eye_dat_path(folder: Path, prefix: str) -> Path:
     return folder / f"{prefix}_arousal info.dat"
 
 
-def parse_numeric_tokens(text: str) -> List[int]:
-    matches = re.findall(r"[-+]?\d+(?:\.\d+)?", text)
-    return [int(round(float(token))) for token in matches]
-
-
 def load_dat_seconds(dat_path: Path) -> List[int]:
-    if not dat_path.exists():
+    if not dat_path.exists() and not Path(binary_sidecar_path(dat_path)).exists():
         raise FileNotFoundError(f"DAT file not found: {dat_path}")
 
-    content = dat_path.read_text(encoding="utf-8").strip()
-    if not content:
-        return []
-
-    numbers = parse_numeric_tokens(content)
-    if not numbers:
-        return []
-
-    # The first value is ignored as requested.
-    seconds = numbers[1:]
-    seconds.sort()
-    return seconds
+    # The first value is the count; read_second_list checks and drops it.
+    seconds = np.sort(read_second_list(dat_path, rounding="round"))
+    return seconds.tolist()
 
 
 def normalize_header(value: object) -> str:
@@ -173,211 +251,471 @@ def to_float(value: object) -> float | None:
     return number
 
 
-def exceeds_threshold(value: float | None, threshold: float) -> bool:
-    return value is not None and value > threshold
-
-
-def load_second_records_from_xlsx(xlsx_path: Path) -> dict[int, dict[str, int | float | None]]:
+def second_array(seconds: Sequence[int] | np.ndarray | None) -> np.ndarray:
+    return np.asarray([] if seconds is None else seconds, dtype=np.int64)
+
+
+class SecondTable(NamedTuple):
+    """
+    Per-second xlsx metrics, column-oriented: sorted unique int32 seconds and
+    one float64 array per metric (44 bytes per second), NaN where a value is missing.
+    """
+    second: np.ndarray
+    alpha_beta: np.ndarray
+    alpha_theta: np.ndarray
+    alpha_ratio: np.ndarray
+    alpha_minus_beta: np.ndarray
+    alpha_minus_theta: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "SecondTable":
+        return cls(np.array([], dtype=np.int32), *(np.array([], dtype=np.float64) for _ in TABLE_METRICS))
+
+    @property
+    def size(self) -> int:
+        return int(self.second.size)
+
+    def lookup(self, seconds: Sequence[int] | np.ndarray) -> np.ndarray:
+        """Row of each second by binary search (O(log n) each), -1 where the table has no such second."""
+        seconds = second_array(seconds)
+        rows = np.searchsorted(self.second, seconds)
+        found = rows < self.second.size
+        found[found] = self.second[rows[found]] == seconds[found]
+        return np.where(found, rows, -1)
+
+    def metrics_at(self, seconds: Sequence[int] | np.ndarray) -> Dict[str, np.ndarray]:
+        """Metric arrays for the given seconds; NaN for seconds the table does not have."""
+        rows = self.lookup(seconds)
+        found = rows >= 0
+        metrics = {}
+        for key in TABLE_METRICS:
+            values = np.full(rows.size, np.nan)
+            values[found] = getattr(self, key)[rows[found]]
+            metrics[key] = values
+        return metrics
+
+    def select(self, mask: np.ndarray) -> "SecondTable":
+        return SecondTable(*(column[mask] for column in self))
+
+
+def load_second_table_from_xlsx(xlsx_path: Path) -> SecondTable:
     if not xlsx_path.exists():
         raise FileNotFoundError(f"XLSX file not found: {xlsx_path}")
 
-    workbook = load_workbook(xlsx_path, data_only=True, read_only=True)
-    try:
-        worksheet = workbook.active
-        rows = worksheet.iter_rows(values_only=True)
-        header_row = next(rows, None)
-        if header_row is None:
-            return {}
-
-        (
-            second_col,
-            theta_power_col,
-            alpha_power_col,
-            beta_power_col,
-            alpha_beta_col,
-            alpha_theta_col,
-            alpha_ratio_col,
-            alpha_minus_beta_col,
-            alpha_minus_theta_col,
-        ) = find_required_columns(header_row)
-        second_records: dict[int, dict[str, int | float | None]] = {}
-
-        for row in rows:
-            second_value = to_float(row[second_col] if second_col < len(row) else None)
-            theta_power_value = to_float(row[theta_power_col] if theta_power_col != -1 and theta_power_col < len(row) else None)
-            alpha_power_value = to_float(row[alpha_power_col] if alpha_power_col != -1 and alpha_power_col < len(row) else None)
-            beta_power_value = to_float(row[beta_power_col] if beta_power_col != -1 and beta_power_col < len(row) else None)
-            alpha_beta_value = to_float(row[alpha_beta_col] if alpha_beta_col < len(row) else None)
-            alpha_theta_value = to_float(row[alpha_theta_col] if alpha_theta_col < len(row) else None)
-            alpha_ratio_value = to_float(row[alpha_ratio_col] if alpha_ratio_col < len(row) else None)
-            alpha_minus_beta_value = to_float(
-                row[alpha_minus_beta_col] if alpha_minus_beta_col != -1 and alpha_minus_beta_col < len(row) else None
-            )
-            alpha_minus_theta_value = to_float(
-                row[alpha_minus_theta_col] if alpha_minus_theta_col != -1 and alpha_minus_theta_col < len(row) else None
-            )
+    # Parsed once per workbook version; later runs memory-map the cached columns.
+    columns = read_xlsx_columns(str(xlsx_path))
+    if not columns:
+        return SecondTable.empty()
+    header_row = list(columns)
+    column_values = list(columns.values())
 
-            if alpha_minus_beta_value is None and alpha_power_value is not None and beta_power_value is not None:
-                alpha_minus_beta_value = alpha_power_value - beta_power_value
-            if alpha_minus_theta_value is None and alpha_power_value is not None and theta_power_value is not None:
-                alpha_minus_theta_value = alpha_power_value - theta_power_value
-
-            if second_value is None:
-                continue
-
-            second = int(round(second_value))
-            second_records[second] = {
-                "second": second,
-                "alpha_beta": alpha_beta_value,
-                "alpha_theta": alpha_theta_value,
-                "alpha_ratio": alpha_ratio_value,
-                "alpha_minus_beta": alpha_minus_beta_value,
-                "alpha_minus_theta": alpha_minus_theta_value,
-            }
-    finally:
-        workbook.close()
-
-    return second_records
+    (
+        second_col,
+        theta_power_col,
+        alpha_power_col,
+        beta_power_col,
+        alpha_beta_col,
+        alpha_theta_col,
+        alpha_ratio_col,
+        alpha_minus_beta_col,
+        alpha_minus_theta_col,
+    ) = find_required_columns(header_row)
+
+    def numbers(col: int) -> np.ndarray:
+        """A column as float64, NaN for blanks and cells to_float rejects."""
+        if col == -1:
+            return np.full(len(column_values[0]), np.nan)
+        values = column_values[col]
+        if values.dtype.kind in "biuf":
+            return values.astype(np.float64)
+        numbers = (to_float(value) for value in values.tolist())
+        return np.array([np.nan if number is None else number for number in numbers], dtype=np.float64)
+
+    alpha_power = numbers(alpha_power_col)
+    alpha_minus_beta = numbers(alpha_minus_beta_col)
+    alpha_minus_theta = numbers(alpha_minus_theta_col)
+    alpha_minus_beta = np.where(np.isnan(alpha_minus_beta), alpha_power - numbers(beta_power_col), alpha_minus_beta)
+    alpha_minus_theta = np.where(np.isnan(alpha_minus_theta), alpha_power - numbers(theta_power_col), alpha_minus_theta)
+    metrics = [
+        numbers(alpha_beta_col),
+        numbers(alpha_theta_col),
+        numbers(alpha_ratio_col),
+        alpha_minus_beta,
+        alpha_minus_theta,
+    ]
+
+    second_values = numbers(second_col)
+    rows = np.flatnonzero(~np.isnan(second_values))
+    seconds = np.rint(second_values[rows]).astype(np.int64)
+    # Sorted by second; when a second repeats, its last row wins.
+    order = np.argsort(seconds, kind="stable")
+    last = np.append(seconds[order][1:] != seconds[order][:-1], True)
+    rows = rows[order[last]]
+    return SecondTable(seconds[order[last]].astype(np.int32), *(values[rows] for values in metrics))
 
 
-def is_positive_record(
-    record: dict[str, int | float | None],
+def select_positive_records(
+    second_table: SecondTable,
     beta: float = 0,
     theta: float = 0,
-) -> bool:
-    alpha_beta_value = record.get("alpha_beta")
-    alpha_theta_value = record.get("alpha_theta")
-    alpha_minus_beta_value = record.get("alpha_minus_beta")
-    alpha_minus_theta_value = record.get("alpha_minus_theta")
-
-    if not isinstance(alpha_beta_value, (int, float)) or not isinstance(alpha_theta_value, (int, float)):
-        return False
-
-    return (
-        alpha_beta_value > 1
-        and alpha_theta_value > 1
-        and (
-            exceeds_threshold(float(alpha_minus_beta_value) if isinstance(alpha_minus_beta_value, (int, float)) else None, beta)
-            or exceeds_threshold(float(alpha_minus_theta_value) if isinstance(alpha_minus_theta_value, (int, float)) else None, theta)
+    alpha_beta_cutoff: float = RATIO_CUTOFF,
+    alpha_theta_cutoff: float = RATIO_CUTOFF,
+) -> SecondTable:
+    """Positive seconds: both ratios above their cutoffs and alpha_minus_beta > beta or alpha_minus_theta > theta."""
+    return second_table.select(positive_matrix(second_table, beta, theta, alpha_beta_cutoff, alpha_theta_cutoff)[0])
+
+
+def load_positive_records_from_xlsx(xlsx_path: Path, beta: float = 0, theta: float = 0) -> SecondTable:
+    return select_positive_records(load_second_table_from_xlsx(xlsx_path), beta, theta)
+
+
+def positive_matrix(
+    metrics: SecondTable,
+    beta: float | Sequence[float] | np.ndarray = 0,
+    theta: float | Sequence[float] | np.ndarray = 0,
+    alpha_beta_cutoff: float = RATIO_CUTOFF,
+    alpha_theta_cutoff: float = RATIO_CUTOFF,
+) -> np.ndarray:
+    """
+    Positive seconds for every (beta, theta) pair at once: a boolean
+    (thresholds x seconds) matrix. NaN metrics never pass.
+    """
+    beta = np.atleast_1d(np.asarray(beta, dtype=np.float64))[:, np.newaxis]
+    theta = np.atleast_1d(np.asarray(theta, dtype=np.float64))[:, np.newaxis]
+    ratio_ok = (metrics.alpha_beta > alpha_beta_cutoff) & (metrics.alpha_theta > alpha_theta_cutoff)
+    return ratio_ok & ((metrics.alpha_minus_beta > beta) | (metrics.alpha_minus_theta > theta))
+
+
+def match_seconds(
+    detected: np.ndarray,
+    reference: np.ndarray,
+    tolerance: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One-to-one matching of sorted unique detected seconds to sorted reference
+    seconds at most tolerance seconds apart. Of the matchings with the most
+    pairs, the one with the smallest total distance is used, so a detection is
+    never paired with a neighbour while its own second is left unused; ties go
+    to reference seconds before the detections (smallest signed total). Returns (matched reference index
+    per detection or -1, used mask over reference).
+    """
+    detected = second_array(detected)
+    lo = np.searchsorted(reference, detected - tolerance, side="left")
+    hi = np.searchsorted(reference, detected + tolerance, side="right")
+    if tolerance == 0:
+        # Detections are unique, so no two of them compete for a reference second.
+        matched = np.where(lo < hi, lo, -1)
+    elif np.any(lo < hi):
+        matched = closest_maximum_matching(detected, reference, lo, hi, tolerance)
+    else:
+        matched = np.full(detected.size, -1, dtype=np.int64)
+    used = np.zeros(reference.size, dtype=bool)
+    used[matched[matched >= 0]] = True
+    return matched, used
+
+
+def closest_maximum_matching(
+    detected: np.ndarray,
+    reference: np.ndarray,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    tolerance: int,
+) -> np.ndarray:
+    """
+    match_seconds with a tolerance; reference[lo[i]:hi[i]] are the candidates
+    of detected[i]. Two crossing pairs can always be swapped without losing a
+    pair or adding distance (the signed total stays the same), so an optimal
+    matching pairs detections and reference seconds in order. A detection that
+    shares no candidate with its neighbours takes its closest candidate (the
+    earlier one on a tie); each run of detections with shared candidates is
+    solved by matching_run.
+    """
+    matched = np.full(detected.size, -1, dtype=np.int64)
+    if detected.size == 0 or reference.size == 0:
+        return matched
+    below = np.searchsorted(reference, detected, side="right") - 1
+    above = below + 1
+    has_below = below >= lo
+    has_above = above < hi
+    distance_below = detected - reference[np.maximum(below, 0)]
+    distance_above = reference[np.minimum(above, reference.size - 1)] - detected
+    take_above = has_above & (~has_below | (distance_above < distance_below))
+    matched[:] = np.where(take_above, above, np.where(has_below, below, -1))
+
+    shared = hi[:-1] > lo[1:]
+    if not shared.any():
+        return matched
+    # Runs of detections linked by shared candidates: [starts[r], stops[r]).
+    edges = np.diff(np.concatenate(([0], shared.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1) + 1
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        matched[start:stop] = matching_run(
+            detected[start:stop].tolist(),
+            reference,
+            lo[start:stop].tolist(),
+            hi[start:stop].tolist(),
+            tolerance,
         )
+    return matched
+
+
+def matching_run(
+    detected: List[int],
+    reference: np.ndarray,
+    lo: List[int],
+    hi: List[int],
+    tolerance: int,
+) -> List[int]:
+    """
+    In-order matching of one run of detections by dynamic programming over the
+    last used reference index. A pair scores pair_value minus its distance
+    times scale minus its signed distance, so more pairs always win, then the
+    smaller total distance, then reference seconds before the detections.
+    States below the next detection's first candidate are interchangeable and
+    merged into -1, which keeps a few states per detection.
+    """
+    n = len(detected)
+    scale = 2 * tolerance * n + 1
+    pair_value = (tolerance * scale + tolerance) * n + 1
+    candidates = reference[lo[0]:hi[-1]].tolist()
+    base = lo[0]
+
+    # steps[i]: state after detection i -> (score, state before, matched index or -1)
+    steps: List[Dict[int, Tuple[int, int, int]]] = []
+    states: List[Tuple[int, int]] = [(-1, 0)]
+    for i, second in enumerate(detected):
+        step = {state: (score, state, -1) for state, score in states}
+        best_score, best_state, k = None, -1, 0
+        for j in range(lo[i], hi[i]):
+            while k < len(states) and states[k][0] < j:
+                if best_score is None or states[k][1] > best_score:
+                    best_state, best_score = states[k]
+                k += 1
+            if best_score is None:
+                continue
+            delta = candidates[j - base] - second
+            score = best_score + pair_value - abs(delta) * scale - delta
+            if j not in step or score > step[j][0]:
+                step[j] = (score, best_state, j)
+
+        reach = lo[i + 1] if i + 1 < n else hi[i]
+        merged = None
+        for state in [state for state in step if state < reach]:
+            entry = step.pop(state)
+            if merged is None or entry[0] > merged[0]:
+                merged = entry
+        if merged is not None:
+            step[-1] = merged
+        steps.append(step)
+        states = sorted((state, entry[0]) for state, entry in step.items())
+
+    matched = [-1] * n
+    state = max(steps[-1], key=lambda key: steps[-1][key][0])
+    for i in range(n - 1, -1, -1):
+        _, state, matched[i] = steps[i][state]
+    return matched
+
+
+def near_seconds(seconds: np.ndarray, reference: Sequence[int] | np.ndarray | None, tolerance: int = 0) -> np.ndarray:
+    """True where some reference second is at most tolerance seconds away (two binary searches each)."""
+    seconds = second_array(seconds)
+    reference = np.sort(second_array(reference))
+    return np.searchsorted(reference, seconds - tolerance, side="left") < np.searchsorted(
+        reference, seconds + tolerance, side="right"
     )
 
 
-def select_positive_records(
-    second_records: Iterable[dict[str, int | float | None]],
-    beta: float = 0,
-    theta: float = 0,
-) -> List[dict[str, int | float | None]]:
-    positive_records = [dict(record) for record in second_records if is_positive_record(record, beta, theta)]
-    positive_records.sort(key=lambda row: int(row["second"]))
-    return positive_records
-
+def count_outcomes(
+    positive: np.ndarray,
+    metrics: SecondTable,
+    dat_seconds: Sequence[int],
+    eye_dat_seconds: Sequence[int] | None = None,
+    tolerance: int = 0,
+    eye_tolerance: int | None = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    compare_seconds counts for every row of a positive matrix. Each dat second
+    is either matched by a positive second (true positive) or missed; positive
+    seconds outside the dat list are false positives unless they are eye movements.
+    """
+    dat = np.sort(second_array(dat_seconds))
+    near_eye = near_seconds(metrics.second, eye_dat_seconds, tolerance if eye_tolerance is None else eye_tolerance)
+    if tolerance == 0:
+        in_dat = np.isin(metrics.second, dat)
+        true_positive = np.count_nonzero(positive & in_dat, axis=-1)
+        false_positive = np.count_nonzero(positive & ~in_dat & ~near_eye, axis=-1)
+        return true_positive, false_positive, dat.size - true_positive
+
+    # Matches within a tolerance depend on which seconds are positive: one matching per row.
+    positive = np.atleast_2d(positive)
+    true_positive = np.zeros(positive.shape[0], dtype=np.int64)
+    false_positive = np.zeros(positive.shape[0], dtype=np.int64)
+    for i, row in enumerate(positive):
+        matched = match_seconds(metrics.second[row], dat, tolerance)[0] >= 0
+        true_positive[i] = np.count_nonzero(matched)
+        false_positive[i] = np.count_nonzero(~matched & ~near_eye[row])
+    return true_positive, false_positive, dat.size - true_positive
+
+
+def count_below(values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    Number of (ascending) thresholds strictly below each value: a value passes
+    "value > thresholds[k]" exactly for k below this rank. NaN passes none.
+    """
+    ranks = np.searchsorted(thresholds, values, side="left")
+    ranks[np.isnan(values)] = 0
+    return ranks
+
+
+def grid_positive_counts(
+    metrics: SecondTable,
+    selected: np.ndarray,
+    alpha_beta_cutoffs: np.ndarray,
+    alpha_theta_cutoffs: np.ndarray,
+    betas: np.ndarray,
+    thetas: np.ndarray,
+) -> np.ndarray:
+    """
+    Number of selected seconds that positive_matrix marks positive, for every
+    (alpha_beta cutoff, alpha_theta cutoff, beta, theta) grid point; all grids
+    ascending. A second is binned once by its rank along each axis; suffix sums
+    over the cutoff axes and prefix sums over the threshold axes then give
+
+        positive = (ratios pass) - (ratios pass, alpha_minus_beta <= beta and alpha_minus_theta <= theta)
+
+    in O(seconds + grid points) instead of one pass over the seconds per point.
+    """
+    ranks = (
+        count_below(metrics.alpha_beta[selected], alpha_beta_cutoffs),
+        count_below(metrics.alpha_theta[selected], alpha_theta_cutoffs),
+        count_below(metrics.alpha_minus_beta[selected], betas),
+        count_below(metrics.alpha_minus_theta[selected], thetas),
+    )
+    shape = (alpha_beta_cutoffs.size + 1, alpha_theta_cutoffs.size + 1, betas.size + 1, thetas.size + 1)
+    cube = np.bincount(np.ravel_multi_index(ranks, shape), minlength=int(np.prod(shape))).reshape(shape)
 
-def load_positive_records_from_xlsx(xlsx_path: Path, beta: float = 0, theta: float = 0) -> List[dict[str, int | float | None]]:
-    second_records = load_second_records_from_xlsx(xlsx_path)
-    return select_positive_records(second_records.values(), beta, theta)
+    # Seconds with rank > i pass cutoff i; seconds with rank <= k fail threshold k.
+    for axis in (0, 1):
+        cube = np.flip(np.cumsum(np.flip(cube, axis=axis), axis=axis), axis=axis)
+    cube = np.cumsum(np.cumsum(cube[1:, 1:], axis=2), axis=3)
+    ratio_pass = cube[:, :, -1:, -1:]
+    return ratio_pass - cube[:, :, :-1, :-1]
 
 
-def build_result_row(
-    second: int,
-    marker_key: str,
-    source_record: dict[str, int | float | None] | None = None,
-) -> dict[str, int | float | None]:
-    return {
-        "second": second,
-        "true_positive": 1 if marker_key == "true_positive" else None,
-        "false_positive": 1 if marker_key == "false_positive" else None,
-        "miss_positive": 1 if marker_key == "miss_positive" else None,
-        "alpha_beta": source_record.get("alpha_beta") if source_record else None,
-        "alpha_theta": source_record.get("alpha_theta") if source_record else None,
-        "alpha_ratio": source_record.get("alpha_ratio") if source_record else None,
-        "alpha_minus_beta": source_record.get("alpha_minus_beta") if source_record else None,
-        "alpha_minus_theta": source_record.get("alpha_minus_theta") if source_record else None,
-    }
+def grid_outcomes(
+    metrics: SecondTable,
+    dat_seconds: Sequence[int],
+    eye_dat_seconds: Sequence[int] | None,
+    alpha_beta_cutoffs: np.ndarray,
+    alpha_theta_cutoffs: np.ndarray,
+    betas: np.ndarray,
+    thetas: np.ndarray,
+    eye_tolerance: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    count_outcomes over the whole grid: (TP, FP, miss) cubes of grid shape.
+    Dat seconds are matched exactly: with a tolerance, whether a second is a hit
+    depends on the other positive seconds and cannot be binned per second.
+    """
+    dat = np.asarray(dat_seconds, dtype=np.int64)
+    in_dat = np.isin(metrics.second, dat)
+    near_eye = near_seconds(metrics.second, eye_dat_seconds, eye_tolerance)
+    grids = (alpha_beta_cutoffs, alpha_theta_cutoffs, betas, thetas)
+    true_positive = grid_positive_counts(metrics, in_dat, *grids)
+    false_positive = grid_positive_counts(metrics, ~in_dat & ~near_eye, *grids)
+    return true_positive, false_positive, dat.size - true_positive
+
+
+def harmonic_ratios(
+    true_positive: np.ndarray,
+    false_positive: np.ndarray,
+    miss_positive: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(誤抓率, 漏抓率, ratio) arrays; NaN where a rate or the ratio is undefined."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        false_rate = false_positive / (true_positive + false_positive)
+        miss_rate = miss_positive / (true_positive + miss_positive)
+        denominator = false_rate + miss_rate
+        ratio = np.where(denominator > 0, 2 * false_rate * miss_rate / denominator, np.nan)
+    return false_rate, miss_rate, ratio
+
+
+class ResultTable(NamedTuple):
+    """
+    compare_seconds rows, column-oriented; marker indexes RESULT_MARKERS.
+    dat_second is the matched dat second of a true positive, the second
+    itself for a miss and -1 for a false positive.
+    """
+    second: np.ndarray
+    marker: np.ndarray
+    dat_second: np.ndarray
+    alpha_beta: np.ndarray
+    alpha_theta: np.ndarray
+    alpha_ratio: np.ndarray
+    alpha_minus_beta: np.ndarray
+    alpha_minus_theta: np.ndarray
+
+    def marked(self, marker_key: str) -> np.ndarray:
+        return self.marker == RESULT_MARKERS.index(marker_key)
+
+    def rows(self) -> Iterator[dict[str, int | float | None]]:
+        """One dict per row keyed like RESULT_HEADER_MAP; unset markers, dat seconds and NaN metrics are None."""
+        columns = {
+            key: np.where(np.isnan(values), None, values.astype(object)).tolist()
+            for key in TABLE_METRICS
+            for values in (getattr(self, key),)
+        }
+        dat_seconds = self.dat_second.tolist()
+        for i, (second, marker) in enumerate(zip(self.second.tolist(), self.marker.tolist())):
+            row: dict[str, int | float | None] = {"second": second}
+            row.update((key, 1 if marker == code else None) for code, key in enumerate(RESULT_MARKERS))
+            row["dat_second"] = dat_seconds[i] if dat_seconds[i] >= 0 else None
+            row.update((key, values[i]) for key, values in columns.items())
+            yield row
 
 
 def compare_seconds(
     dat_seconds: Sequence[int],
-    xlsx_positive_records: Iterable[dict[str, int | float | None]],
+    xlsx_positive_records: SecondTable,
     eye_dat_seconds: Sequence[int] | None = None,
-    all_second_records: dict[int, dict[str, int | float | None]] | None = None,
-) -> Tuple[int, int, int, List[dict[str, int | float | None]]]:
-    dat_list = list(dat_seconds)
-    xlsx_list = list(xlsx_positive_records)
-    eye_dat_second_set = set(eye_dat_seconds or [])
-    all_second_records = all_second_records or {}
-
-    pointer = 0
-    true_positive = 0
-    false_positive = 0
-    miss_positive = 0
-    result_rows: List[dict[str, int | float | None]] = []
-
-    for record in xlsx_list:
-        second = int(record["second"])
-        alpha_ratio = record.get("alpha_ratio")
-        alpha_minus_beta = record.get("alpha_minus_beta")
-        alpha_minus_theta = record.get("alpha_minus_theta")
-
-        while pointer < len(dat_list) and dat_list[pointer] < second:
-            miss_positive += 1
-            miss_second = dat_list[pointer]
-            result_rows.append(
-                build_result_row(
-                    miss_second,
-                    "miss_positive",
-                    all_second_records.get(miss_second),
-                )
-            )
-            pointer += 1
-
-        if pointer < len(dat_list) and dat_list[pointer] == second:
-            true_positive += 1
-            result_rows.append(
-                build_result_row(
-                    second,
-                    "true_positive",
-                    {
-                        "alpha_beta": record.get("alpha_beta"),
-                        "alpha_theta": record.get("alpha_theta"),
-                        "alpha_ratio": alpha_ratio,
-                        "alpha_minus_beta": alpha_minus_beta,
-                        "alpha_minus_theta": alpha_minus_theta,
-                    },
-                )
-            )
-            pointer += 1
-        else:
-            if second in eye_dat_second_set:
-                continue
-            false_positive += 1
-            result_rows.append(
-                build_result_row(
-                    second,
-                    "false_positive",
-                    {
-                        "alpha_beta": record.get("alpha_beta"),
-                        "alpha_theta": record.get("alpha_theta"),
-                        "alpha_ratio": alpha_ratio,
-                        "alpha_minus_beta": alpha_minus_beta,
-                        "alpha_minus_theta": alpha_minus_theta,
-                    },
-                )
-            )
-
-    while pointer < len(dat_list):
-        miss_positive += 1
-        miss_second = dat_list[pointer]
-        result_rows.append(
-            build_result_row(
-                miss_second,
-                "miss_positive",
-                all_second_records.get(miss_second),
-            )
-        )
-        pointer += 1
+    all_second_records: SecondTable | None = None,
+    tolerance: int = 0,
+    eye_tolerance: int | None = None,
+) -> Tuple[int, int, int, ResultTable]:
+    """
+    Match the positive xlsx seconds against the dat seconds. A positive second
+    within ±tolerance of an unused dat second is a true positive (see
+    match_seconds); other positive seconds are false positives unless an eye
+    movement lies within ±eye_tolerance (default: tolerance). Unused dat
+    seconds are misses. Rows are ordered by second.
+    """
+    dat = np.sort(second_array(dat_seconds))
+    positive = xlsx_positive_records
+
+    matched_index, used = match_seconds(positive.second, dat, tolerance)
+    matched = matched_index >= 0
+    near_eye = near_seconds(
+        positive.second, eye_dat_seconds, tolerance if eye_tolerance is None else eye_tolerance
+    )
 
-    return true_positive, false_positive, miss_positive, result_rows
+    true_rows = positive.select(matched)
+    false_rows = positive.select(~matched & ~near_eye)
+    miss_seconds = dat[~used]
+    all_second_records = all_second_records if all_second_records is not None else SecondTable.empty()
+    miss_metrics = all_second_records.metrics_at(miss_seconds)
+
+    seconds = np.concatenate((true_rows.second, false_rows.second, miss_seconds)).astype(np.int64)
+    dat_seconds = np.concatenate((dat[matched_index[matched]], np.full(false_rows.size, -1), miss_seconds)).astype(np.int64)
+    markers = np.repeat(np.arange(3, dtype=np.int8), (true_rows.size, false_rows.size, miss_seconds.size))
+    # A true positive comes before a miss of the same (repeated) dat second.
+    order = np.lexsort((markers, seconds))
+    metrics = (
+        np.concatenate((getattr(true_rows, key), getattr(false_rows, key), miss_metrics[key]))[order]
+        for key in TABLE_METRICS
+    )
+    result = ResultTable(seconds[order], markers[order], dat_seconds[order], *metrics)
+    return true_rows.size, false_rows.size, int(miss_seconds.size), result
 
 
 def safe_divide_float(numerator: int, denominator: int) -> float | None:
@@ -396,8 +734,8 @@ def safe_divide(numerator: int, denominator: int) -> str:
     return format_float(safe_divide_float(numerator, denominator))
 
 
-def calculate_percentage_threshold(sorted_values: Sequence[float], percentage: int = 50) -> float:
-    if not sorted_values:
+def calculate_percentage_threshold(sorted_values: Sequence[float] | np.ndarray, percentage: int = 50) -> float:
+    if len(sorted_values) == 0:
         raise ValueError("Cannot calculate percentage threshold from empty values.")
     if percentage < 1 or percentage > 100:
         raise ValueError(f"Percentage {percentage} is out of range.")
@@ -406,52 +744,50 @@ def calculate_percentage_threshold(sorted_values: Sequence[float], percentage: i
     return float(sorted_values[position - 1])
 
 
-def calculate_percentage_threshold_or_none(
+def calculate_percentage_thresholds(
     sorted_values: Sequence[float],
+    percentages: Sequence[float] | np.ndarray,
+) -> np.ndarray:
+    """calculate_percentage_threshold for many percentages at once."""
+    values = np.asarray(sorted_values, dtype=np.float64)
+    if values.size == 0:
+        raise ValueError("Cannot calculate percentage threshold from empty values.")
+    percentages = np.asarray(percentages, dtype=np.float64)
+    if np.any((percentages < 1) | (percentages > 100)):
+        raise ValueError(f"Percentages {percentages} are out of range.")
+
+    positions = np.maximum(1, np.ceil(values.size * percentages / 100)).astype(np.int64)
+    return values[positions - 1]
+
+
+def calculate_percentage_threshold_or_none(
+    sorted_values: Sequence[float] | np.ndarray,
     percentage: int = 50,
 ) -> float | None:
-    if not sorted_values:
+    if len(sorted_values) == 0:
         return None
     return calculate_percentage_threshold(sorted_values, percentage)
 
 
 def collect_metric_values(
-    result_rows: Sequence[dict[str, int | float | None]],
+    result: ResultTable,
     marker_key: str,
     metric_key: str,
-) -> List[float]:
-    values: List[float] = []
-    for row in result_rows:
-        if row.get(marker_key) != 1:
-            continue
-        metric_value = row.get(metric_key)
-        if isinstance(metric_value, (int, float)):
-            values.append(float(metric_value))
-    return values
+) -> np.ndarray:
+    values = getattr(result, metric_key)[result.marked(marker_key)]
+    return values[~np.isnan(values)]
 
 
 def collect_metric_pairs(
-    result_rows: Sequence[dict[str, int | float | None]],
+    result: ResultTable,
     marker_key: str,
     x_key: str,
     y_key: str,
-) -> Tuple[List[float], List[float]]:
-    x_values: List[float] = []
-    y_values: List[float] = []
-
-    for row in result_rows:
-        if row.get(marker_key) != 1:
-            continue
-
-        x_value = row.get(x_key)
-        y_value = row.get(y_key)
-        if not isinstance(x_value, (int, float)) or not isinstance(y_value, (int, float)):
-            continue
-
-        x_values.append(float(x_value))
-        y_values.append(float(y_value))
-
-    return x_values, y_values
+) -> Tuple[np.ndarray, np.ndarray]:
+    x_values = getattr(result, x_key)[result.marked(marker_key)]
+    y_values = getattr(result, y_key)[result.marked(marker_key)]
+    valid = ~np.isnan(x_values) & ~np.isnan(y_values)
+    return x_values[valid], y_values[valid]
 
 
 def summarize_counts(
@@ -482,21 +818,429 @@ def summarize_counts(
     }
 
 
-def save_result_xlsx(output_path: Path, result_rows: Sequence[dict[str, int | float | None]]) -> None:
+def save_result_xlsx(output_path: Path, result: ResultTable, tolerance: int = 0) -> None:
     output_path.parent.mkdir(parents=True, exist_ok=True)
+    header_map = TOLERANCE_RESULT_HEADER_MAP if tolerance > 0 else RESULT_HEADER_MAP
 
     workbook = Workbook()
     worksheet = workbook.active
     worksheet.title = "result"
-    worksheet.append(RESULT_HEADERS)
+    worksheet.append([header for header, _ in header_map])
 
-    for row in result_rows:
-        worksheet.append([row.get(key) for _, key in RESULT_HEADER_MAP])
+    for row in result.rows():
+        worksheet.append([row.get(key) for _, key in header_map])
 
     workbook.save(output_path)
     workbook.close()
 
 
+def frontier(order: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Indices along order where values reach a new maximum (the upper envelope of a curve)."""
+    ordered = values[order]
+    previous_max = np.concatenate(([-np.inf], np.maximum.accumulate(ordered)[:-1]))
+    return order[ordered > previous_max]
+
+
+def grid_search(
+    metrics: SecondTable,
+    dat_seconds: Sequence[int],
+    eye_dat_seconds: Sequence[int] | None,
+    alpha_beta_cutoffs: Sequence[float],
+    alpha_theta_cutoffs: Sequence[float],
+    betas: Sequence[float],
+    thetas: Sequence[float],
+    eye_tolerance: int = 0,
+) -> dict[str, np.ndarray]:
+    """
+    Evaluate every grid point. Returns flat columns named as GRID_HEADERS, in
+    C order of the (alpha_beta cutoff, alpha_theta cutoff, beta, theta) grid.
+    tpr / fpr are the ROC axes (fpr over the non-alpha, non-eye-movement seconds);
+    precision with tpr (recall) gives the PR curve.
+    """
+    grids = [np.unique(np.asarray(values, dtype=np.float64)) for values in (alpha_beta_cutoffs, alpha_theta_cutoffs, betas, thetas)]
+    true_positive, false_positive, miss_positive = grid_outcomes(
+        metrics, dat_seconds, eye_dat_seconds, *grids, eye_tolerance=eye_tolerance
+    )
+    false_rate, miss_rate, ratio = harmonic_ratios(true_positive, false_positive, miss_positive)
+
+    dat = np.asarray(dat_seconds, dtype=np.int64)
+    negatives = np.count_nonzero(
+        ~np.isin(metrics.second, dat) & ~near_seconds(metrics.second, eye_dat_seconds, eye_tolerance)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tpr = true_positive / dat.size
+        fpr = false_positive / negatives
+        precision = true_positive / (true_positive + false_positive)
+
+    axes = list(np.meshgrid(*grids, indexing="ij"))
+    columns = axes + [true_positive, false_positive, miss_positive, false_rate, miss_rate, ratio, tpr, fpr, precision]
+    return {header: np.ravel(values) for header, values in zip(GRID_HEADERS, columns)}
+
+
+def grid_rows(grid: dict[str, np.ndarray], indices: np.ndarray | Sequence[int]) -> Iterable[List[object]]:
+    columns = [
+        np.where(np.isnan(grid[key][indices]), None, grid[key][indices].astype(object)).tolist()
+        if grid[key].dtype.kind == "f"
+        else grid[key][indices].tolist()
+        for key in GRID_HEADERS
+    ]
+    return (list(row) for row in zip(*columns))
+
+
+def save_grid_search_csv(output_path: Path, grid: dict[str, np.ndarray]) -> None:
+    """Every grid point; a full grid is too large to write through openpyxl quickly."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(GRID_HEADERS)
+        writer.writerows(grid_rows(grid, np.arange(grid["ratio"].size)))
+
+
+def save_grid_search_xlsx(
+    output_path: Path,
+    grid: dict[str, np.ndarray],
+    best: int | None,
+) -> None:
+    """Sheets: best (optimal point), roc and pr (upper envelopes of the grid)."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tpr = np.nan_to_num(grid["tpr"], nan=-np.inf)
+    precision = np.nan_to_num(grid["precision"], nan=-np.inf)
+    fpr = np.nan_to_num(grid["fpr"], nan=np.inf)
+    sheets = {
+        "best": [] if best is None else [best],
+        # ROC: by fpr ascending (ties: best tpr first); PR: by recall descending.
+        "roc": frontier(np.lexsort((-tpr, fpr)), tpr),
+        "pr": frontier(np.lexsort((-precision, -tpr)), precision),
+    }
+
+    workbook = Workbook(write_only=True)
+    for title, indices in sheets.items():
+        worksheet = workbook.create_sheet(title)
+        worksheet.append(GRID_HEADERS)
+        for row in grid_rows(grid, indices):
+            worksheet.append(row)
+    workbook.save(output_path)
+    workbook.close()
+
+
+def plot_grid_heatmap(
+    output_path: Path,
+    grid: dict[str, np.ndarray],
+    best: int,
+    title: str,
+) -> None:
+    """ratio over beta x theta at the optimal ratio cutoffs."""
+    from matplotlib.figure import Figure
+
+    cutoffs = (grid["alpha_beta_cutoff"] == grid["alpha_beta_cutoff"][best]) & (
+        grid["alpha_theta_cutoff"] == grid["alpha_theta_cutoff"][best]
+    )
+    betas = np.unique(grid["beta"][cutoffs])
+    thetas = np.unique(grid["theta"][cutoffs])
+    ratio = grid["ratio"][cutoffs].reshape(betas.size, thetas.size)
+
+    figure = Figure(figsize=(8, 6.5))
+    axes = figure.add_subplot()
+    image = axes.pcolormesh(thetas, betas, ratio, shading="nearest", cmap="viridis")
+    axes.plot(grid["theta"][best], grid["beta"][best], marker="x", color="red", markersize=10)
+    axes.set_xlabel("alpha_minus_theta threshold")
+    axes.set_ylabel("alpha_minus_beta threshold")
+    axes.set_title(
+        f"{title} (alpha_beta > {grid['alpha_beta_cutoff'][best]:g}, alpha_theta > {grid['alpha_theta_cutoff'][best]:g})"
+    )
+    figure.colorbar(image, ax=axes, label="ratio")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    figure.savefig(output_path, dpi=150, bbox_inches="tight")
+
+
+def default_grid_output_path(folder: Path, prefix: str, suffix: str = ".xlsx") -> Path:
+    return folder / f"{prefix}_alpha_grid_search{suffix}"
+
+
+def default_heatmap_output_path(folder: Path, prefix: str) -> Path:
+    return folder / f"{prefix}_alpha_grid_heatmap.png"
+
+
+class SubjectData(NamedTuple):
+    folder: str
+    prefix: str
+    metrics: SecondTable | None
+    dat_seconds: np.ndarray
+    eye_dat_seconds: np.ndarray
+    error: str
+    # detected_metric_values(), computed once when the subject is loaded.
+    beta_values: np.ndarray
+    theta_values: np.ndarray
+
+
+class ThresholdChoice(NamedTuple):
+    """Best percentile of a sweep and the sweep itself (one row per percentage)."""
+    percentage: float | None
+    beta: float | None
+    theta: float | None
+    percentages: np.ndarray
+    betas: np.ndarray
+    thetas: np.ndarray
+    counts: np.ndarray
+    ratios: np.ndarray
+
+
+def find_subject_pairs(root: Path) -> List[Tuple[Path, str]]:
+    """(folder, prefix) of every *_alpha.dat under root with a matching *_raw_FP2.xlsx."""
+    pairs: List[Tuple[Path, str]] = []
+    for dat_path in sorted(root.rglob("*_alpha.dat")):
+        prefix = dat_path.name[: -len("_alpha.dat")]
+        _, xlsx_path = build_input_paths(dat_path.parent, prefix)
+        if xlsx_path.exists():
+            pairs.append((dat_path.parent, prefix))
+        else:
+            print(f"略過 {dat_path}: 找不到 {xlsx_path.name}")
+    return pairs
+
+
+def load_subject(folder: Path, prefix: str, **tolerances: int | None) -> SubjectData:
+    # Batch worker entry point: one failing subject must not stop the others.
+    try:
+        dat_path, xlsx_path = build_input_paths(folder, prefix)
+        eye_dat_path = build_eye_dat_path(folder, prefix)
+        dat_seconds = second_array(load_dat_seconds(dat_path))
+        eye_dat_seconds = second_array(load_dat_seconds(eye_dat_path) if eye_dat_path.exists() else [])
+        metrics = load_second_table_from_xlsx(xlsx_path)
+        subject = SubjectData(str(folder), prefix, metrics, dat_seconds, eye_dat_seconds, "", np.array([]), np.array([]))
+        beta_values, theta_values = detected_metric_values(subject, **tolerances)
+        return subject._replace(beta_values=beta_values, theta_values=theta_values)
+    except Exception as e:
+        print(f"Error evaluating {folder / prefix}: {e}")
+        empty = second_array(None)
+        return SubjectData(str(folder), prefix, None, empty, empty, str(e), np.array([]), np.array([]))
+
+
+def subject_key(subject: SubjectData) -> Tuple[str, str]:
+    return subject.folder, subject.prefix
+
+
+def subject_counts(subject: SubjectData, betas: np.ndarray, thetas: np.ndarray, **tolerances: int | None) -> np.ndarray:
+    """(thresholds x 3) TP/FP/miss of one subject for every (beta, theta) pair."""
+    counts = count_outcomes(
+        positive_matrix(subject.metrics, betas, thetas),
+        subject.metrics,
+        subject.dat_seconds,
+        subject.eye_dat_seconds,
+        **tolerances,
+    )
+    return np.stack(counts, axis=-1)
+
+
+def detected_metric_values(subject: SubjectData, **tolerances: int | None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    alpha_minus_beta / alpha_minus_theta of the baseline (beta = theta = 0) true
+    and false positives, the values main() takes its sweep percentiles from.
+    """
+    positive = select_positive_records(subject.metrics)
+    _, _, _, result = compare_seconds(subject.dat_seconds, positive, subject.eye_dat_seconds, **tolerances)
+    counted = result.marked("true_positive") | result.marked("false_positive")
+    beta_values = result.alpha_minus_beta[counted]
+    theta_values = result.alpha_minus_theta[counted]
+    return beta_values[~np.isnan(beta_values)], theta_values[~np.isnan(theta_values)]
+
+
+def choose_pooled_threshold(
+    subjects: Sequence[SubjectData],
+    percentages: np.ndarray,
+    **tolerances: int | None,
+) -> ThresholdChoice | None:
+    """
+    Percentile sweep of main() over the pooled subjects: thresholds from the
+    pooled TP + FP values (cached on each subject by load_subject), counts
+    summed over subjects, lowest pooled ratio wins. tolerances (tolerance,
+    eye_tolerance) are passed on to the matching.
+    """
+    beta_values = np.sort(np.concatenate([subject.beta_values for subject in subjects])) if subjects else np.array([])
+    theta_values = np.sort(np.concatenate([subject.theta_values for subject in subjects])) if subjects else np.array([])
+    if beta_values.size == 0 or theta_values.size == 0:
+        return None
+
+    betas = calculate_percentage_thresholds(beta_values, percentages)
+    thetas = calculate_percentage_thresholds(theta_values, percentages)
+    counts = sum(subject_counts(subject, betas, thetas, **tolerances) for subject in subjects)
+    _, _, ratios = harmonic_ratios(counts[:, 0], counts[:, 1], counts[:, 2])
+    if np.all(np.isnan(ratios)):
+        return ThresholdChoice(None, None, None, percentages, betas, thetas, counts, ratios)
+    best = int(np.nanargmin(ratios))
+    return ThresholdChoice(
+        float(percentages[best]), float(betas[best]), float(thetas[best]), percentages, betas, thetas, counts, ratios
+    )
+
+
+# Loaded subjects of the running batch, set once per worker process.
+_batch_subjects: List[SubjectData] = []
+
+
+def init_batch_worker(subjects: Sequence[SubjectData]) -> None:
+    global _batch_subjects
+    _batch_subjects = list(subjects)
+
+
+def evaluate_fold(
+    held_out: int | None,
+    percentages: np.ndarray,
+    tolerances: Dict[str, int | None],
+) -> Tuple[ThresholdChoice | None, np.ndarray | None]:
+    """
+    Batch worker: threshold sweep over the batch subjects except held_out (all
+    of them for None) and the held-out subject's counts at the chosen threshold.
+    """
+    subjects = [subject for i, subject in enumerate(_batch_subjects) if i != held_out]
+    choice = choose_pooled_threshold(subjects, percentages, **tolerances)
+    if held_out is None or choice is None or choice.percentage is None:
+        return choice, None
+    held_out_subject = _batch_subjects[held_out]
+    counts = subject_counts(held_out_subject, np.array([choice.beta]), np.array([choice.theta]), **tolerances)[0]
+    return choice, counts
+
+
+def count_columns(counts: Sequence[int] | None) -> List[object]:
+    if counts is None:
+        return [None] * len(COUNT_HEADERS)
+    summary = summarize_counts(*(int(count) for count in counts))
+    return [summary[key] for key in COUNT_HEADERS]
+
+
+def pooled_row(
+    method: str,
+    counts: Sequence[int] | None,
+    choice: ThresholdChoice | None = None,
+) -> List[object]:
+    thresholds = [choice.percentage, choice.beta, choice.theta] if choice else [None, None, None]
+    if counts is None:
+        return [method] + thresholds + [None] * (len(POOLED_HEADERS) - 4)
+    summary = summarize_counts(*(int(count) for count in counts))
+    return [method] + thresholds + [summary[key] for key in POOLED_HEADERS[4:]]
+
+
+def save_summary_xlsx(
+    output_path: Path,
+    subject_rows: Sequence[Sequence[object]],
+    pooled_rows: Sequence[Sequence[object]],
+    choice: ThresholdChoice | None,
+) -> None:
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    workbook = Workbook(write_only=True)
+    for title, header, rows in (("subjects", SUBJECT_HEADERS, subject_rows), ("pooled", POOLED_HEADERS, pooled_rows)):
+        worksheet = workbook.create_sheet(title)
+        worksheet.append(header)
+        for row in rows:
+            worksheet.append(list(row))
+
+    worksheet = workbook.create_sheet("sweep")
+    worksheet.append(["percentage", "beta", "theta"] + COUNT_HEADERS)
+    if choice is not None:
+        for i in range(choice.percentages.size):
+            worksheet.append(
+                [float(choice.percentages[i]), float(choice.betas[i]), float(choice.thetas[i])]
+                + count_columns(choice.counts[i])
+            )
+    workbook.save(output_path)
+    workbook.close()
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    """
+    Cross-subject evaluation: every subject is loaded in a worker process, then
+    the pooled threshold sweep and one leave-one-subject-out sweep per subject
+    (threshold chosen on the other subjects, counted on the held-out one) run
+    in worker processes as well. Baseline and pooled counts are summarized in
+    one workbook with them.
+    """
+    root = normalize_user_path(args.batch_root).resolve()
+    pairs = find_subject_pairs(root)
+    if not pairs:
+        print(f"找不到 *_alpha.dat / *_raw_FP2.xlsx 配對: {root}")
+        return 1
+
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(pairs)))
+    tolerances = dict(tolerance=args.tolerance, eye_tolerance=args.eye_tolerance)
+    if workers == 1:
+        loaded = [load_subject(folder, prefix, **tolerances) for folder, prefix in pairs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(load_subject, folder, prefix, **tolerances) for folder, prefix in pairs]
+            loaded = [future.result() for future in futures]
+    subjects = [subject for subject in loaded if subject.metrics is not None]
+
+    # Task None is the pooled sweep over all subjects, task i holds subject i out.
+    percentages = np.arange(SWEEP_START, SWEEP_END + args.sweep_step / 2, args.sweep_step)
+    tasks: List[int | None] = [None] + list(range(len(subjects)))
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1:
+        init_batch_worker(subjects)
+        folds = [evaluate_fold(task, percentages, tolerances) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_batch_worker, initargs=(subjects,)) as pool:
+            futures = [pool.submit(evaluate_fold, task, percentages, tolerances) for task in tasks]
+            folds = [future.result() for future in futures]
+    choice = folds[0][0]
+
+    zero = np.zeros(1)
+    baseline = {subject_key(subject): subject_counts(subject, zero, zero, **tolerances)[0] for subject in subjects}
+    pooled = {}
+    if choice is not None and choice.percentage is not None:
+        pooled = {
+            subject_key(subject): subject_counts(
+                subject, np.array([choice.beta]), np.array([choice.theta]), **tolerances
+            )[0]
+            for subject in subjects
+        }
+
+    loso = {
+        subject_key(held_out): (fold_choice, counts)
+        for held_out, (fold_choice, counts) in zip(subjects, folds[1:])
+        if counts is not None
+    }
+
+    subject_rows = []
+    for subject in loaded:
+        fold_choice, loso_counts = loso.get(subject_key(subject), (None, None))
+        subject_rows.append(
+            [subject.prefix, subject.folder, "error" if subject.error else "ok"]
+            + [int(subject.dat_seconds.size), int(subject.eye_dat_seconds.size)]
+            + count_columns(baseline.get(subject_key(subject)))
+            + count_columns(pooled.get(subject_key(subject)))
+            + ([fold_choice.percentage, fold_choice.beta, fold_choice.theta] if fold_choice else [None, None, None])
+            + count_columns(loso_counts)
+            + [subject.error or None]
+        )
+
+    def total(counts_by_subject: dict) -> np.ndarray | None:
+        return sum(counts_by_subject.values()) if counts_by_subject else None
+
+    pooled_rows = [
+        pooled_row("baseline (beta = theta = 0)", total(baseline)),
+        pooled_row("pooled threshold", total(pooled), choice if pooled else None),
+        pooled_row("leave-one-subject-out", total({key: counts for key, (_, counts) in loso.items()})),
+    ]
+    output_path = (
+        normalize_user_path(args.summary_output) if args.summary_output else root / DEFAULT_SUMMARY_NAME
+    )
+    save_summary_xlsx(output_path, subject_rows, pooled_rows, choice)
+
+    print(f"受試者: {len(subjects)} / {len(loaded)}（失敗 {len(loaded) - len(subjects)}）")
+    for row in pooled_rows:
+        summary = dict(zip(POOLED_HEADERS, row))
+        print(
+            f"{summary['method']}: true_positive={summary['true_positive']}, "
+            f"false_positive={summary['false_positive']}, miss_positive={summary['miss_positive']}, "
+            f"ratio={format_float(summary['ratio'])}"
+        )
+    if pooled:
+        print(
+            f"最佳合併門檻: {choice.percentage:g}% -> beta={format_float(choice.beta)}, "
+            f"theta={format_float(choice.theta)}"
+        )
+    print(f"摘要: {output_path}")
+    return 1 if len(subjects) < len(loaded) else 0
+
+
 def default_output_path(folder: Path, prefix: str) -> Path:
     return folder / f"{prefix}_alpha_compare_result.xlsx"
 
@@ -507,6 +1251,18 @@ def default_plot_output_path(folder: Path, prefix: str) -> Path:
 
 def main() -> int:
     args = parse_args()
+    if args.tolerance < 0 or (args.eye_tolerance is not None and args.eye_tolerance < 0):
+        print("--tolerance and --eye-tolerance must not be negative.")
+        return 1
+    if not args.sweep_step > 0:
+        print("--sweep-step must be greater than 0.")
+        return 1
+    if not 0 < args.grid_step <= 100:
+        print("--grid-step must be greater than 0 and at most 100.")
+        return 1
+    if args.batch_root:
+        return run_batch(args)
+
     raw_input_path = args.input_path
     if not raw_input_path:
         raw_input_path = input("請輸入 .set 資料夾或檔案路徑: ")
@@ -525,19 +1281,21 @@ def main() -> int:
 
     dat_seconds = load_dat_seconds(dat_path)
     eye_dat_seconds = load_dat_seconds(eye_dat_path) if eye_dat_path.exists() else []
-    all_second_records = load_second_records_from_xlsx(xlsx_path)
-    xlsx_positive_records = select_positive_records(all_second_records.values())
+    all_second_records = load_second_table_from_xlsx(xlsx_path)
+    xlsx_positive_records = select_positive_records(all_second_records)
 
-    true_positive, false_positive, miss_positive, result_rows = compare_seconds(
+    true_positive, false_positive, miss_positive, result = compare_seconds(
         dat_seconds,
         xlsx_positive_records,
         eye_dat_seconds,
         all_second_records,
+        tolerance=args.tolerance,
+        eye_tolerance=args.eye_tolerance,
     )
     summary = summarize_counts(true_positive, false_positive, miss_positive)
 
-    tp_alpha_minus_beta = sorted(collect_metric_values(result_rows, "true_positive", "alpha_minus_beta"))
-    tp_alpha_minus_theta = sorted(collect_metric_values(result_rows, "true_positive", "alpha_minus_theta"))
+    tp_alpha_minus_beta = np.sort(collect_metric_values(result, "true_positive", "alpha_minus_beta"))
+    tp_alpha_minus_theta = np.sort(collect_metric_values(result, "true_positive", "alpha_minus_theta"))
     tp_alpha_minus_beta_median = calculate_percentage_threshold_or_none(
         tp_alpha_minus_beta
     )
@@ -545,8 +1303,8 @@ def main() -> int:
         tp_alpha_minus_theta
     )
 
-    fp_alpha_minus_beta = sorted(collect_metric_values(result_rows, "false_positive", "alpha_minus_beta"))
-    fp_alpha_minus_theta = sorted(collect_metric_values(result_rows, "false_positive", "alpha_minus_theta"))
+    fp_alpha_minus_beta = np.sort(collect_metric_values(result, "false_positive", "alpha_minus_beta"))
+    fp_alpha_minus_theta = np.sort(collect_metric_values(result, "false_positive", "alpha_minus_theta"))
     fp_alpha_minus_beta_median = calculate_percentage_threshold_or_none(
         fp_alpha_minus_beta
     )
@@ -555,25 +1313,28 @@ def main() -> int:
     )
 
     tp_alpha_beta, tp_alpha_theta = collect_metric_pairs(
-        result_rows,
+        result,
         "true_positive",
         "alpha_beta",
         "alpha_theta",
     )
     fp_alpha_beta, fp_alpha_theta = collect_metric_pairs(
-        result_rows,
+        result,
         "false_positive",
         "alpha_beta",
         "alpha_theta",
     )
     miss_alpha_beta, miss_alpha_theta = collect_metric_pairs(
-        result_rows,
+        result,
         "miss_positive",
         "alpha_beta",
         "alpha_theta",
     )
 
-    save_result_xlsx(output_path, result_rows)
+    save_result_xlsx(output_path, result, args.tolerance)
+    # Imported here so the matching code (and --batch) loads without the plotting module.
+    from plot_alpha_detection_quadrants import plot_alpha_detection_quadrants
+
     plot_alpha_detection_quadrants(
         tp_alpha_beta,
         tp_alpha_theta,
@@ -610,40 +1371,88 @@ def main() -> int:
     print(f"誤抓 alpha_minus_beta 中位數: {format_float(fp_alpha_minus_beta_median)}")
     print(f"誤抓 alpha_minus_theta 中位數: {format_float(fp_alpha_minus_theta_median)}")
 
-    tp_fp_beta = sorted(tp_alpha_minus_beta + fp_alpha_minus_beta)
-    tp_fp_theta = sorted(tp_alpha_minus_theta + fp_alpha_minus_theta)
-    if tp_fp_beta and tp_fp_theta:
-        min_index = 30
-        min_value: float | None = None
-        for i in range(30,81):
-            beta = calculate_percentage_threshold(tp_fp_beta, i)
-            theta = calculate_percentage_threshold(tp_fp_theta, i)
-            xlsx_positive_records = select_positive_records(all_second_records.values(), beta, theta)
-            true_positive, false_positive, miss_positive, result_rows = compare_seconds(
-                dat_seconds,
-                xlsx_positive_records,
-                eye_dat_seconds,
-                all_second_records,
-            )
-            print(f"\n第{i}%: ")
+    tp_fp_beta = np.sort(np.concatenate((tp_alpha_minus_beta, fp_alpha_minus_beta)))
+    tp_fp_theta = np.sort(np.concatenate((tp_alpha_minus_theta, fp_alpha_minus_theta)))
+    if tp_fp_beta.size and tp_fp_theta.size:
+        # Every percentile at once: one row of the positive matrix per threshold pair.
+        percentages = np.arange(SWEEP_START, SWEEP_END + args.sweep_step / 2, args.sweep_step)
+        betas = calculate_percentage_thresholds(tp_fp_beta, percentages)
+        thetas = calculate_percentage_thresholds(tp_fp_theta, percentages)
+        true_positives, false_positives, miss_positives = count_outcomes(
+            positive_matrix(all_second_records, betas, thetas),
+            all_second_records,
+            dat_seconds,
+            eye_dat_seconds,
+            tolerance=args.tolerance,
+            eye_tolerance=args.eye_tolerance,
+        )
+        _, _, ratios = harmonic_ratios(true_positives, false_positives, miss_positives)
+        for percentage, true_positive, false_positive, miss_positive, ratio in zip(
+            percentages, true_positives.tolist(), false_positives.tolist(), miss_positives.tolist(), ratios.tolist()
+        ):
+            print(f"\n第{percentage:g}%: ")
             print(f"true_positve: {true_positive}" )
             print(f"false_positive: {false_positive}" )
             print(f"miss_positive: {miss_positive}" )
             print(f"total: {true_positive + false_positive + miss_positive}" )
             print("誤抓率: " + safe_divide(false_positive, true_positive + false_positive))
             print("漏抓率: " + safe_divide(miss_positive, true_positive + miss_positive))
-            false_rate = safe_divide_float(false_positive, true_positive + false_positive)
-            miss_rate = safe_divide_float(miss_positive, true_positive + miss_positive)
-            ratio = 2 * false_rate * miss_rate / (false_rate + miss_rate) if (false_rate is not None and miss_rate is not None and (false_rate + miss_rate) > 0) else None
-            print(f"ratio: {ratio if ratio is not None else 'N/A'}" )
-            if ratio is not None and (min_value is None or ratio < min_value):
-                min_value = ratio
-                min_index = i
+            print(f"ratio: {ratio if not math.isnan(ratio) else 'N/A'}" )
+
+        min_index = f"{SWEEP_START:g}"
+        min_value: float | None = None
+        if not np.all(np.isnan(ratios)):
+            best = int(np.nanargmin(ratios))
+            min_index = f"{percentages[best]:g}"
+            min_value = float(ratios[best])
 
         print(f"\n最佳解: {min_index}% -> ratio={format_float(min_value)}")
     else:
         print("\n最佳解: N/A (沒有足夠的 alpha_minus 資料可做門檻搜尋)")
 
+    if args.grid_search and args.tolerance:
+        print("\n網格搜尋只支援 --tolerance 0，略過")
+    elif args.grid_search and tp_fp_beta.size and tp_fp_theta.size:
+        grid_percentages = np.arange(args.grid_step, 100 + args.grid_step / 2, args.grid_step)
+        grid_percentages = grid_percentages[(grid_percentages >= 1) & (grid_percentages <= 100)]
+        ratio_cutoffs = [float(value) for value in args.ratio_cutoffs.split(",") if value.strip()]
+        grid = grid_search(
+            all_second_records,
+            dat_seconds,
+            eye_dat_seconds,
+            ratio_cutoffs,
+            ratio_cutoffs,
+            calculate_percentage_thresholds(tp_fp_beta, grid_percentages),
+            calculate_percentage_thresholds(tp_fp_theta, grid_percentages),
+            eye_tolerance=args.tolerance if args.eye_tolerance is None else args.eye_tolerance,
+        )
+        best = None if np.all(np.isnan(grid["ratio"])) else int(np.nanargmin(grid["ratio"]))
+        grid_output_path = default_grid_output_path(folder, prefix)
+        grid_csv_path = default_grid_output_path(folder, prefix, ".csv")
+        save_grid_search_xlsx(grid_output_path, grid, best)
+        save_grid_search_csv(grid_csv_path, grid)
+
+        print(f"\n網格搜尋: {grid['ratio'].size} 組門檻 -> {grid_csv_path}")
+        print(f"最佳解與 ROC/PR 曲線: {grid_output_path}")
+        if best is None:
+            print("網格最佳解: N/A")
+        else:
+            heatmap_output_path = default_heatmap_output_path(folder, prefix)
+            plot_grid_heatmap(heatmap_output_path, grid, best, f"{prefix} ratio")
+            print(
+                f"網格最佳解: alpha_beta > {grid['alpha_beta_cutoff'][best]:g}, "
+                f"alpha_theta > {grid['alpha_theta_cutoff'][best]:g}, "
+                f"beta={format_float(float(grid['beta'][best]))}, "
+                f"theta={format_float(float(grid['theta'][best]))} -> "
+                f"ratio={format_float(float(grid['ratio'][best]))} "
+                f"(true_positive={grid['true_positive'][best]}, "
+                f"false_positive={grid['false_positive'][best]}, "
+                f"miss_positive={grid['miss_positive'][best]})"
+            )
+            print(f"熱圖: {heatmap_output_path}")
+    elif args.grid_search:
+        print("\n網格最佳解: N/A (沒有足夠的 alpha_minus 資料可做門檻搜尋)")
+
     return 0
 
 
@@ -0,0 +1,293 @@
+import os
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, List, NamedTuple
+
+import numpy as np
+import pyedflib
+
+# Upper bound for the whole signals an EdfSession keeps in memory.
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+ANNOTATION_LABEL = "EDF Annotations"
+# edflib keeps the record duration in units of 100 ns.
+TIME_UNITS_PER_SECOND = 10_000_000
+# Onset of the first TAL in the first data record: the sub-second start time.
+FIRST_ONSET_PATTERN = re.compile(rb"^([+-]\d+(?:\.\d+)?)\x14")
+
+
+class EdfLayout(NamedTuple):
+    """
+    Header and byte layout of the data records of a continuous 16-bit
+    EDF/EDF+ file. Per-signal lists exclude annotation signals, matching
+    pyedflib's indices and sample rates are derived as pyedflib derives them.
+    """
+    header_bytes: int
+    n_records: int
+    record_samples: int
+    record_duration: float
+    start_datetime: datetime
+    labels: List[str]
+    dimensions: List[str]
+    offsets: List[int]
+    samples_per_record: List[int]
+    gains: List[float]
+    digital_offsets: List[float]
+    physical_mins: List[float]
+    digital_mins: List[float]
+
+
+def read_edf_layout(edf_path: str) -> EdfLayout | None:
+    """
+    Parse the EDF header for memory-mapped access. Returns None for files that
+    need pyedflib: BDF (24-bit) and discontinuous EDF+D recordings. A record
+    count of -1 (a file still being recorded) is taken from the file size.
+    """
+    with open(edf_path, "rb") as f:
+        fixed = f.read(256)
+        if len(fixed) < 256 or fixed[:1] != b"0":
+            return None
+        reserved = fixed[192:236].decode("ascii", "replace")
+        if reserved.startswith("EDF+D"):
+            return None
+        header_bytes = int(fixed[184:192])
+        n_signals = int(fixed[252:256])
+        signal_header = f.read(n_signals * 256).decode("latin-1")
+        n_records_header = int(fixed[236:244])
+        duration_units = int(round(float(fixed[244:252]) * TIME_UNITS_PER_SECOND))
+        if duration_units <= 0:
+            return None
+
+    def field(start: int, width: int) -> List[str]:
+        base = start * n_signals
+        return [signal_header[base + i * width: base + (i + 1) * width].strip() for i in range(n_signals)]
+
+    # Field offsets in units of n_signals bytes: label 16, transducer 80,
+    # dimension 8, physical min/max 8 + 8, digital min/max 8 + 8, prefilter 80,
+    # samples per record 8, reserved 32.
+    labels = field(0, 16)
+    dimensions = field(96, 8)
+    physical_min = [float(v) for v in field(104, 8)]
+    physical_max = [float(v) for v in field(112, 8)]
+    digital_min = [float(v) for v in field(120, 8)]
+    digital_max = [float(v) for v in field(128, 8)]
+    samples_per_record = [int(v) for v in field(216, 8)]
+
+    record_samples = sum(samples_per_record)
+    # A file still being recorded may carry -1 records; count the complete ones.
+    file_records = (os.path.getsize(edf_path) - header_bytes) // (2 * record_samples) if record_samples else 0
+    n_records = file_records if n_records_header < 0 else min(n_records_header, file_records)
+
+    start = header_start_datetime(fixed)
+    annotation = labels.index(ANNOTATION_LABEL) if ANNOTATION_LABEL in labels else -1
+    if reserved.startswith("EDF+") and annotation >= 0 and n_records > 0:
+        start += timedelta(microseconds=first_onset_microseconds(edf_path, header_bytes, samples_per_record, annotation))
+
+    layout = EdfLayout(
+        header_bytes, n_records, record_samples, duration_units / TIME_UNITS_PER_SECOND, start,
+        [], [], [], [], [], [], [], [],
+    )
+    offset = 0
+    for i, label in enumerate(labels):
+        if label != ANNOTATION_LABEL:
+            # Same scaling as edflib: physical = bitvalue * (offset + digital).
+            gain = (physical_max[i] - physical_min[i]) / (digital_max[i] - digital_min[i])
+            layout.labels.append(label)
+            layout.dimensions.append(dimensions[i])
+            layout.offsets.append(offset)
+            layout.samples_per_record.append(samples_per_record[i])
+            layout.gains.append(gain)
+            layout.digital_offsets.append(physical_max[i] / gain - digital_max[i])
+            layout.physical_mins.append(physical_min[i])
+            layout.digital_mins.append(digital_min[i])
+        offset += samples_per_record[i]
+    return layout
+
+
+def header_start_datetime(fixed: bytes) -> datetime:
+    """Start date and time of the fixed header ("dd.mm.yy", "hh.mm.ss"; yy 85-99 is 19yy)."""
+    day, month, year = (int(v) for v in fixed[168:176].decode("ascii").split("."))
+    hour, minute, second = (int(v) for v in fixed[176:184].decode("ascii").split("."))
+    # EDF+ also writes the 4-digit year in the recording field: "Startdate dd-MMM-yyyy ...".
+    recording = fixed[88:168].decode("ascii", "replace").split()
+    if len(recording) > 1 and recording[0] == "Startdate" and recording[1][-4:].isdigit():
+        year = int(recording[1][-4:])
+    else:
+        year += 1900 if year >= 85 else 2000
+    return datetime(year, month, day, hour, minute, second)
+
+
+def first_onset_microseconds(edf_path: str, header_bytes: int, samples_per_record: List[int], annotation: int) -> int:
+    """Fractional second of the EDF+ start: the first TAL onset of the first record."""
+    with open(edf_path, "rb") as f:
+        f.seek(header_bytes + 2 * sum(samples_per_record[:annotation]))
+        tal = f.read(2 * samples_per_record[annotation])
+    match = FIRST_ONSET_PATTERN.match(tal)
+    if match is None:
+        return 0
+    onset = match.group(1).decode("ascii")
+    fraction = onset.split(".")[1][:7] if "." in onset else ""
+    # edflib keeps 100 ns units. pyedflib 0.1.x divides those by 100 instead of
+    # 10, so its getStartdatetime() is off for sub-second starts; use the onset.
+    return int(round(int(fraction.ljust(7, "0")) / 10)) if fraction else 0
+
+
+class EdfSession:
+    """
+    One open EDF shared by every step of a run. The header is parsed once;
+    whole signals are read on first use and kept in a least-recently-used
+    cache bounded by max_cache_bytes. Cached signals are read-only.
+
+    Continuous 16-bit EDF files are memory-mapped: the header is parsed here
+    (pyedflib is not opened, so a file that is still being recorded works),
+    each channel is a strided int16 view of the data records and only the
+    samples actually read are scaled to physical values. Other files are read
+    through pyedflib.
+    """
+
+    def __init__(self, edf_path: str, max_cache_bytes: int = DEFAULT_CACHE_BYTES):
+        if not os.path.exists(edf_path):
+            raise FileNotFoundError(f"EDF not found: {edf_path}")
+        self.path = edf_path
+        self.max_cache_bytes = int(max_cache_bytes)
+        self.reader = None
+        self.layout: EdfLayout | None = None
+        self.records: np.ndarray | None = None
+        self._open_records()
+        if self.layout is None:
+            self._open_reader()
+        self._cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._cache_bytes = 0
+
+    def __enter__(self) -> "EdfSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _open_records(self) -> None:
+        try:
+            layout = read_edf_layout(self.path)
+        except (OSError, ValueError, ZeroDivisionError):
+            layout = None
+        if layout is None or layout.n_records == 0:
+            return
+        self.layout = layout
+        self.records = np.memmap(
+            self.path,
+            dtype="<i2",
+            mode="r",
+            offset=layout.header_bytes,
+            shape=(layout.n_records, layout.record_samples),
+        )
+        self.labels: List[str] = list(layout.labels)
+        self.sample_rates: List[float] = [spr / layout.record_duration for spr in layout.samples_per_record]
+        self.n_samples: List[int] = [layout.n_records * spr for spr in layout.samples_per_record]
+        self.dimensions: List[str] = list(layout.dimensions)
+        self.start_datetime: datetime = layout.start_datetime
+
+    def _open_reader(self) -> None:
+        self.reader = pyedflib.EdfReader(self.path)
+        self.labels = list(self.reader.getSignalLabels())
+        self.sample_rates = [float(self.reader.getSampleFrequency(i)) for i in range(len(self.labels))]
+        self.n_samples = [int(n) for n in self.reader.getNSamples()]
+        self.dimensions = [self.reader.getPhysicalDimension(i) for i in range(len(self.labels))]
+        self.start_datetime = self.reader.getStartdatetime()
+
+    def digital(self, ch_idx: int) -> np.ndarray:
+        """
+        Zero-copy (records x samples per record) int16 view of one channel.
+        Physical values are gain * (digital_offset + digital), see scaling().
+        """
+        if self.records is None:
+            raise ValueError(f"{self.path} is not memory-mapped")
+        start = self.layout.offsets[ch_idx]
+        return self.records[:, start:start + self.layout.samples_per_record[ch_idx]]
+
+    def scaling(self, ch_idx: int) -> tuple:
+        return self.layout.gains[ch_idx], self.layout.digital_offsets[ch_idx]
+
+    def _read_mapped(self, ch_idx: int, start: int, n: int, out: np.ndarray | None = None) -> np.ndarray:
+        view = self.digital(ch_idx)
+        spr = self.layout.samples_per_record[ch_idx]
+        first = start // spr
+        last = -(-(start + n) // spr)
+        skip = start - first * spr
+        # Only the records holding [start, start + n) are touched and scaled.
+        digital = view[first:last].reshape(-1)[skip:skip + n]
+        gain, digital_offset = self.scaling(ch_idx)
+        out = np.add(digital, digital_offset, out=out, dtype=np.float64)
+        return np.multiply(out, gain, out=out)
+
+    def close(self) -> None:
+        self.records = None
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        self._cache.clear()
+        self._cache_bytes = 0
+
+    def find_channel(self, target: str) -> int | None:
+        """Index of the first channel whose label contains target (case-insensitive)."""
+        target_lower = target.lower()
+        for i, label in enumerate(self.labels):
+            if target_lower in label.lower():
+                return i
+        return None
+
+    def signal(self, ch_idx: int) -> np.ndarray:
+        """Whole physical signal of one channel, from the cache when possible."""
+        cached = self._cache.get(ch_idx)
+        if cached is not None:
+            self._cache.move_to_end(ch_idx)
+            return cached
+
+        signal = self.read(ch_idx)
+        signal.setflags(write=False)
+        if signal.nbytes <= self.max_cache_bytes:
+            while self._cache and self._cache_bytes + signal.nbytes > self.max_cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= evicted.nbytes
+            self._cache[ch_idx] = signal
+            self._cache_bytes += signal.nbytes
+        return signal
+
+    def read(
+        self,
+        ch_idx: int,
+        start: int = 0,
+        n: int | None = None,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        Samples [start, start + n) of one channel, written into out when given.
+        Served from the cache when the whole signal is already there; partial
+        reads are not cached.
+        """
+        if n is None:
+            n = self.n_samples[ch_idx] - start
+        n = max(0, min(n, self.n_samples[ch_idx] - start))
+        cached = self._cache.get(ch_idx)
+        if cached is not None:
+            self._cache.move_to_end(ch_idx)
+            values = cached[start:start + n]
+        elif self.records is not None:
+            return self._read_mapped(ch_idx, start, n, out)
+        else:
+            values = self.reader.readSignal(ch_idx, start, n)
+        if out is None:
+            return values
+        out[:] = values
+        return out
+
+
+@contextmanager
+def use_session(source: "str | EdfSession") -> Iterator[EdfSession]:
+    """Use an open session as is, or open (and afterwards close) one for a path."""
+    if isinstance(source, EdfSession):
+        yield source
+        return
+    with EdfSession(source) as session:
+        yield session
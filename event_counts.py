@@ -0,0 +1,65 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+def rolling_count(
+    event_times: Sequence[float] | np.ndarray,
+    query_times: Sequence[float] | np.ndarray,
+    window: float = 30.0,
+    *,
+    align: str = "right",
+    lower_bound: float | None = None,
+) -> np.ndarray:
+    """
+    Number of events inside a closed window around each query time, using
+    binary search over the sorted event times (O((n + m) log n)).
+
+    align="right":  [t - window, t]
+    align="left":   [t, t + window]
+    align="center": [t - window / 2, t + window / 2]
+
+    Window starts are clipped to lower_bound when it is given.
+    """
+    events = np.sort(np.asarray(event_times, dtype=float).ravel())
+    queries = np.asarray(query_times, dtype=float)
+
+    if align == "right":
+        lo, hi = queries - window, queries
+    elif align == "left":
+        lo, hi = queries, queries + window
+    elif align == "center":
+        lo, hi = queries - window / 2.0, queries + window / 2.0
+    else:
+        raise ValueError(f"Unknown window alignment '{align}'")
+    if lower_bound is not None:
+        lo = np.maximum(lo, lower_bound)
+
+    return np.searchsorted(events, hi, side="right") - np.searchsorted(events, lo, side="left")
+
+
+def trailing_sum(values: Sequence[float] | np.ndarray, window: int = 30) -> np.ndarray:
+    """
+    Sum of the last `window` values at every position (fewer at the start) via a
+    cumulative sum. For per-second counts this equals pandas
+    rolling(window, min_periods=1).sum().
+    """
+    data = np.asarray(values, dtype=float)
+    csum = np.concatenate(([0.0], np.cumsum(data)))
+    starts = np.maximum(np.arange(1, data.size + 1) - int(window), 0)
+    return csum[1:] - csum[starts]
+
+
+def interval_counts(
+    event_times: Sequence[float] | np.ndarray,
+    width: int = 30,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Histogram of events over fixed intervals [k * width, (k + 1) * width).
+    Returns (interval start, count) for the non-empty intervals, sorted by start.
+    """
+    times = np.asarray(event_times).ravel()
+    if times.size == 0:
+        return np.array([], dtype=int), np.array([], dtype=int)
+    starts = (times // width) * width
+    return np.unique(starts, return_counts=True)
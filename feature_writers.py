@@ -0,0 +1,139 @@
+import csv
+import os
+from typing import Callable, Dict, List
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+# A feature table is an ordered mapping of column name -> 1-D array, all of the
+# same length. A run produces one table per channel, keyed by sheet title.
+# Integer columns with empty cells are int64 masked arrays, see nullable_int.
+FeatureTable = Dict[str, np.ndarray]
+
+RED_FONT = Font(color="FFFF0000")
+HIGHLIGHT_COLUMNS = ("alpha_beta", "alpha_theta")
+HIGHLIGHT_THRESHOLD = 1.0
+
+OUTPUT_EXTENSIONS = {
+    "xlsx": ".xlsx",
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "npz": ".npz",
+}
+
+
+def nullable_int(values: np.ndarray) -> np.ndarray:
+    """Whole-number float column as an int64 masked array; NaN cells are masked."""
+    values = np.asarray(values, dtype=float)
+    empty = np.isnan(values)
+    return np.ma.array(np.where(empty, 0, np.rint(values)).astype(np.int64), mask=empty)
+
+
+def column_values(values: np.ndarray) -> List[object]:
+    """Python values of one column for row-oriented writers; NaN and masked cells become None."""
+    if np.ma.isMaskedArray(values):
+        return values.tolist()
+    if values.dtype.kind in "iub":
+        return values.tolist()
+    if values.dtype.kind == "f":
+        return np.where(np.isnan(values), None, values.astype(object)).tolist()
+    return values.tolist()
+
+
+def combine_column_groups(tables: Dict[str, FeatureTable]) -> FeatureTable:
+    """
+    Flatten several tables into one. A single table is returned as is; with
+    several, "second" is shared and every other column becomes "<title>.<name>".
+    """
+    if len(tables) == 1:
+        return next(iter(tables.values()))
+
+    combined: FeatureTable = {}
+    seconds = None
+    for title, table in tables.items():
+        if seconds is None:
+            seconds = table["second"]
+            combined["second"] = seconds
+        elif not np.array_equal(seconds, table["second"]):
+            raise ValueError(f"Table '{title}' has different seconds and cannot be combined.")
+        for name, values in table.items():
+            if name != "second":
+                combined[f"{title}.{name}"] = values
+    return combined
+
+
+def write_xlsx(output_path: str, tables: Dict[str, FeatureTable]) -> None:
+    """
+    Streaming (write-only) workbook with one sheet per table. Ratios above 1 are
+    shown in red by a single conditional-formatting rule per column.
+    """
+    wb = Workbook(write_only=True)
+    for title, table in tables.items():
+        ws = wb.create_sheet(title=title)
+        fieldnames = list(table)
+        n_rows = len(next(iter(table.values()))) if table else 0
+        if n_rows:
+            for name in HIGHLIGHT_COLUMNS:
+                if name not in fieldnames:
+                    continue
+                letter = get_column_letter(fieldnames.index(name) + 1)
+                ws.conditional_formatting.add(
+                    f"{letter}2:{letter}{n_rows + 1}",
+                    CellIsRule(operator="greaterThan", formula=[str(HIGHLIGHT_THRESHOLD)], font=RED_FONT),
+                )
+        ws.append(fieldnames)
+        for row in zip(*(column_values(values) for values in table.values())):
+            ws.append(row)
+    wb.save(output_path)
+
+
+def write_csv(output_path: str, tables: Dict[str, FeatureTable]) -> None:
+    table = combine_column_groups(tables)
+    with open(output_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(table))
+        for row in zip(*(column_values(values) for values in table.values())):
+            writer.writerow(["" if value is None else value for value in row])
+
+
+def write_parquet(output_path: str, tables: Dict[str, FeatureTable]) -> None:
+    try:
+        import pandas as pd
+
+        columns = {
+            name: pd.arrays.IntegerArray(np.ma.getdata(values), np.ma.getmaskarray(values))
+            if np.ma.isMaskedArray(values)
+            else values
+            for name, values in combine_column_groups(tables).items()
+        }
+        pd.DataFrame(columns).to_parquet(output_path, index=False)
+    except ImportError as e:
+        raise RuntimeError(f"Parquet output requires pandas and pyarrow: {e}") from None
+
+
+def write_npz(output_path: str, tables: Dict[str, FeatureTable]) -> None:
+    """Masked columns are stored as their data plus a boolean "<name>.mask" array."""
+    arrays: Dict[str, np.ndarray] = {}
+    for name, values in combine_column_groups(tables).items():
+        arrays[name] = np.ma.getdata(values)
+        if np.ma.isMaskedArray(values):
+            arrays[f"{name}.mask"] = np.ma.getmaskarray(values)
+    np.savez_compressed(output_path, **arrays)
+
+
+WRITERS: Dict[str, Callable[[str, Dict[str, FeatureTable]], None]] = {
+    "xlsx": write_xlsx,
+    "csv": write_csv,
+    "parquet": write_parquet,
+    "npz": write_npz,
+}
+
+
+def write_feature_tables(output_path: str, tables: Dict[str, FeatureTable], fmt: str = "xlsx") -> None:
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown output format '{fmt}', expected one of: {', '.join(WRITERS)}")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    WRITERS[fmt](output_path, tables)
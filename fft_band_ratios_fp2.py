@@ -1,44 +1,154 @@
 import argparse
+import csv
+import glob
+import json
 import os
-from typing import Dict, List, Tuple
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
 
 import numpy as np
-import pyedflib
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font
-
-RED_FONT = Font(color="FFFF0000")
-
-XLSX_FIELDNAMES = [
-    "second",
-    "theta_power",
-    "alpha_power",
-    "beta_power",
-    "alpha_beta",
-    "alpha_theta",
-    "alpha_total",
-    "alpha_peak",
-    "alpha_minus_beta",
-    "alpha_minus_theta",
-    "eyeblinking_count",
-    "react_time",
-]
-
-def load_eyeblinkning(data_path: str) -> List[int]:
-    if not os.path.exists(data_path):
+
+from edf_session import EdfSession, use_session
+from event_counts import rolling_count
+from feature_writers import OUTPUT_EXTENSIONS, FeatureTable, nullable_int, write_feature_tables
+from second_lists import binary_sidecar_path, read_second_list
+from spectrum_cache import (
+    SpectraWriter,
+    file_content_hash,
+    load_spectra,
+    prune_stale_entries,
+    spectrum_cache_dir,
+)
+from status_events import read_status_events, sample_clock
+
+# Seconds per FFT batch; bounds the size of the temporary spectra matrix.
+DEFAULT_CHUNK_SECONDS = 1024
+# Seconds of samples read from the EDF per block when streaming.
+DEFAULT_BLOCK_SECONDS = 300
+# eyeblinking_count counts blinks in [t - 30, t].
+BLINK_WINDOW_SECONDS = 30
+
+DEFAULT_MANIFEST_NAME = "fft_band_ratios_manifest.csv"
+MANIFEST_FIELDNAMES = ["edf", "output", "status", "seconds", "valid", "skipped", "elapsed_s", "error"]
+
+
+class Band(NamedTuple):
+    name: str
+    low: float
+    high: float
+    include_high: bool = False
+
+
+class BandFeature(NamedTuple):
+    # kind is one of "power", "ratio", "difference" or "peak".
+    name: str
+    kind: str
+    band: str
+    other: str | None = None
+
+
+class BandTable(NamedTuple):
+    bands: Dict[str, Band]
+    features: List[BandFeature]
+
+
+BAND_PRESETS: Dict[str, Band] = {
+    "delta": Band("delta", 1.0, 4.0),
+    "theta": Band("theta", 4.0, 8.0),
+    "alpha": Band("alpha", 8.0, 13.0),
+    "sigma": Band("sigma", 12.0, 16.0),
+    "beta": Band("beta", 13.0, 30.0, True),
+    "gamma": Band("gamma", 30.0, 45.0),
+    "total": Band("total", 1.0, 40.0, True),
+}
+
+# Frequency range searched for the dominant spectral peak of "peak" features.
+PEAK_RANGE = (2.0, 30.0)
+
+DEFAULT_FEATURES = "theta,alpha,beta,alpha/beta,alpha/theta,alpha/total,alpha_peak,alpha-beta,alpha-theta"
+
+
+def parse_feature_spec(spec: str) -> List[BandFeature]:
+    """
+    Parse a comma separated feature list:
+    "alpha" -> alpha_power, "alpha/beta" -> alpha_beta (ratio),
+    "alpha-beta" -> alpha_minus_beta (difference), "alpha_peak" -> alpha_peak.
+    """
+    features: List[BandFeature] = []
+    for token in (part.strip() for part in spec.split(",")):
+        if not token:
+            continue
+        if "/" in token:
+            band, other = (name.strip() for name in token.split("/", 1))
+            features.append(BandFeature(f"{band}_{other}", "ratio", band, other))
+        elif "-" in token:
+            band, other = (name.strip() for name in token.split("-", 1))
+            features.append(BandFeature(f"{band}_minus_{other}", "difference", band, other))
+        elif token.endswith("_peak"):
+            features.append(BandFeature(token, "peak", token[: -len("_peak")]))
+        else:
+            features.append(BandFeature(f"{token}_power", "power", token))
+    return features
+
+
+def parse_band_spec(spec: str) -> Dict[str, Band]:
+    """
+    Parse "name=low-high" pairs separated by commas, e.g. "sigma=11-16,gamma=30-45".
+    Custom bands are half-open [low, high).
+    """
+    bands: Dict[str, Band] = {}
+    for token in (part.strip() for part in spec.split(",")):
+        if not token:
+            continue
+        name, _, edges = token.partition("=")
+        low, _, high = edges.partition("-")
+        try:
+            bands[name.strip()] = Band(name.strip(), float(low), float(high))
+        except ValueError:
+            raise ValueError(f"Invalid band definition '{token}', expected name=low-high") from None
+    return bands
+
+
+def build_band_table(
+    features: str = DEFAULT_FEATURES,
+    bands: Dict[str, Band] | None = None,
+) -> BandTable:
+    table_bands = dict(BAND_PRESETS)
+    table_bands.update(bands or {})
+    table_features = parse_feature_spec(features)
+    for feature in table_features:
+        for name in (feature.band, feature.other):
+            if name is not None and name not in table_bands:
+                raise ValueError(f"Feature '{feature.name}' uses undefined band '{name}'")
+    return BandTable(table_bands, table_features)
+
+
+def feature_names(table: BandTable) -> List[str]:
+    return [feature.name for feature in table.features]
+
+
+def xlsx_fieldnames(table: BandTable) -> List[str]:
+    return ["second"] + feature_names(table) + ["eyeblinking_count", "react_time"]
+
+
+DEFAULT_BAND_TABLE = build_band_table()
+
+# Feature order of the last axis returned by compute_band_features for the
+# default band table.
+BAND_FEATURE_NAMES = feature_names(DEFAULT_BAND_TABLE)
+
+XLSX_FIELDNAMES = xlsx_fieldnames(DEFAULT_BAND_TABLE)
+
+def load_eyeblinkning(data_path: str) -> np.ndarray:
+    if not os.path.exists(data_path) and not os.path.exists(binary_sidecar_path(data_path)):
         print(f"Warning: arousal data file not found: {data_path}")
-        return []
+        return np.array([], dtype=np.int64)
     try:
-        with open(data_path, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            if not content:
-                return []
-            parts = content.split(",")
-            blinks_seconds = [int(float(p)) for p in parts[1:]]  # Skip the first part (count)
-            return blinks_seconds
-    except Exception as e:
+        return read_second_list(data_path, rounding="truncate")
+    except (OSError, ValueError) as e:
         print(f"Error reading arousal data from {data_path}: {e}")
-        return []
+        return np.array([], dtype=np.int64)
 
 def find_channel_index(labels: List[str], target: str) -> int | None:
     target_lower = target.lower()
@@ -47,279 +157,781 @@ def find_channel_index(labels: List[str], target: str) -> int | None:
             return i
     return None
 
-def load_channel_signal(edf_path: str, channel_name: str) -> Tuple[np.ndarray, float]:
-    if not os.path.exists(edf_path):
-        raise FileNotFoundError(f"EDF not found: {edf_path}")
+def resolve_channel_indices(labels: List[str], channel_names: List[str]) -> List[int]:
+    """
+    Map requested channel names to signal indices. "all" selects every signal
+    except the Status channel. Duplicates are dropped, request order is kept.
+    """
+    if any(name.lower() == "all" for name in channel_names):
+        return [i for i, label in enumerate(labels) if "status" not in label.lower()]
 
-    f = pyedflib.EdfReader(edf_path)
-    try:
-        labels = f.getSignalLabels()
-        ch_idx = find_channel_index(labels, channel_name)
+    indices: List[int] = []
+    for name in channel_names:
+        ch_idx = find_channel_index(labels, name)
         if ch_idx is None:
-            raise ValueError(f"Channel '{channel_name}' not found in {edf_path}")
+            raise ValueError(f"Channel '{name}' not found")
+        if ch_idx not in indices:
+            indices.append(ch_idx)
+    return indices
 
-        signal = f.readSignal(ch_idx).astype(float)
-        fs = float(f.getSampleFrequency(ch_idx))
-    finally:
-        f.close()
 
-    return signal, fs
+def select_channels(
+    session: EdfSession,
+    channel_names: List[str],
+) -> Tuple[List[int], List[str], float]:
+    """
+    Resolve channel names on an open EDF to (indices, labels, fs). All selected
+    channels must share one sample rate; with "all", channels at other rates
+    are skipped.
+    """
+    labels = session.labels
+    edf_path = session.path
+    try:
+        indices = resolve_channel_indices(labels, channel_names)
+    except ValueError as e:
+        raise ValueError(f"{e} in {edf_path}") from None
+    if not indices:
+        raise ValueError(f"No channels selected in {edf_path}")
+
+    rates = [session.sample_rates[i] for i in indices]
+    fs = rates[0]
+    if any(name.lower() == "all" for name in channel_names):
+        fs = max(set(rates), key=rates.count)
+        skipped = [labels[i] for i, rate in zip(indices, rates) if rate != fs]
+        if skipped:
+            print(f"Warning: skipping channels not sampled at {fs:g} Hz: {', '.join(skipped)}")
+        indices = [i for i, rate in zip(indices, rates) if rate == fs]
+    elif len(set(rates)) > 1:
+        raise ValueError(f"Selected channels have different sample rates in {edf_path}")
+
+    return indices, [labels[i] for i in indices], fs
+
+
+def load_channel_signals(
+    edf_path: str | EdfSession,
+    channel_names: List[str],
+) -> Tuple[List[str], np.ndarray, float]:
+    """
+    Read several channels from one EDF in a single open.
+    Returns (labels, channels x samples signal matrix, fs).
+    """
+    with use_session(edf_path) as session:
+        indices, selected_labels, fs = select_channels(session, channel_names)
+        signals = np.vstack([session.signal(i) for i in indices]).astype(float, copy=False)
 
+    return selected_labels, signals, fs
 
-def compute_band_powers_and_ratios_fft(
+
+def iter_channel_blocks(
+    session: EdfSession,
+    indices: List[int],
+    fs: float,
+    block_seconds: int = DEFAULT_BLOCK_SECONDS,
+    start_sample: int = 0,
+) -> Iterator[np.ndarray]:
+    """
+    Yield (channels x samples) blocks of whole seconds read with partial
+    readSignal calls, so only one block per channel is held in memory.
+    Reading begins at start_sample; the last block holds whatever samples remain.
+    """
+    n_samples = min(session.n_samples[i] for i in indices)
+    step = max(1, int(block_seconds)) * max(1, int(round(fs)))
+    for start in range(max(0, int(start_sample)), n_samples, step):
+        n = min(step, n_samples - start)
+        block = np.empty((len(indices), n), dtype=float)
+        for row, ch_idx in enumerate(indices):
+            session.read(ch_idx, start, n, out=block[row])
+        yield block
+
+
+def load_channel_signal(edf_path: str | EdfSession, channel_name: str) -> Tuple[np.ndarray, float]:
+    _, signals, fs = load_channel_signals(edf_path, [channel_name])
+    return signals[0], fs
+
+
+def segment_power_spectra(
+    segments: np.ndarray,
+    window: np.ndarray,
+    fs: float,
+    *,
+    use_psd: bool = False,
+) -> np.ndarray:
+    """
+    Power spectra for a (segments x win) matrix, one row per segment.
+    Each row is mean-removed and windowed before the FFT.
+    """
+    win = int(window.size)
+    segs = segments - np.mean(segments, axis=1, keepdims=True)
+    segs *= window
+    power = np.abs(np.fft.rfft(segs, axis=1)) ** 2
+    if use_psd:
+        scale_to_psd(power, win, fs, float(np.sum(window ** 2)))
+    return power
+
+
+def scale_to_psd(power: np.ndarray, win: int, fs: float, window_power: float) -> np.ndarray:
+    """Scale (segments x bins) |FFT|^2 spectra in place to a one-sided PSD."""
+    power /= float(fs) * window_power
+    # One-sided PSD scaling for real signals:
+    # double all bins except DC (0 Hz) and Nyquist (fs/2, when N even).
+    if win % 2 == 0:
+        if power.shape[1] > 2:
+            power[:, 1:-1] *= 2.0
+    else:
+        if power.shape[1] > 1:
+            power[:, 1:] *= 2.0
+    return power
+
+
+def resolve_window(
+    fs: float,
+    window_sec: float | None = None,
+    hop_sec: float | None = None,
+) -> Tuple[int, int]:
+    """
+    Window and hop length in samples. The defaults give the non-overlapping
+    1-second epochs (win = hop = round(fs)).
+    """
+    win = int(round(fs * window_sec)) if window_sec is not None else int(round(fs))
+    hop = int(round(fs * hop_sec)) if hop_sec is not None else win
+    return win, hop
+
+
+def count_epochs(n_samples: int, win: int, hop: int) -> int:
+    if win <= 0 or hop <= 0 or n_samples < win:
+        return 0
+    return (n_samples - win) // hop + 1
+
+
+def epoch_view(signal: np.ndarray, win: int, hop: int) -> np.ndarray:
+    """
+    Read-only (epochs x win) view of a 1-D signal with epochs starting every hop
+    samples. Overlapping epochs share memory with the signal instead of being copied.
+    """
+    n_epochs = count_epochs(int(signal.size), win, hop)
+    if hop == win:
+        return signal[: n_epochs * win].reshape(n_epochs, win)
+    return np.lib.stride_tricks.sliding_window_view(signal, win)[::hop][:n_epochs]
+
+
+def epoch_end_seconds(
+    n_epochs: int,
+    fs: float,
+    window_sec: float | None = None,
+    hop_sec: float | None = None,
+) -> np.ndarray:
+    """
+    Time (s) at the end of each epoch. The default 1-second epochs are numbered
+    by 1-based whole seconds, also when fs is not an integer; only a custom
+    window or hop gives fractional times.
+    """
+    if window_sec is None and hop_sec is None:
+        return np.arange(1, n_epochs + 1, dtype=np.int64)
+    win, hop = resolve_window(fs, window_sec, hop_sec)
+    return (np.arange(n_epochs, dtype=float) * hop + win) / float(fs)
+
+
+def band_bins(freqs: np.ndarray, band: Band) -> np.ndarray:
+    """Indices of the frequency bins inside band."""
+    upper = freqs <= band.high if band.include_high else freqs < band.high
+    return np.flatnonzero((freqs >= band.low) & upper)
+
+
+def pairwise_row_sum(values: np.ndarray) -> np.ndarray:
+    """
+    Row sums of a 2-D array that are bit-identical to calling np.sum on each row.
+    np.sum(axis=1) accumulates short rows sequentially, while 1-D np.sum uses
+    pairwise summation; this mirrors numpy's pairwise scheme across all rows.
+    """
+    n = values.shape[1]
+    if n < 8:
+        res = np.zeros(values.shape[0], dtype=float)
+        for i in range(n):
+            res += values[:, i]
+        return res
+    if n <= 128:
+        r = values[:, :8].copy()
+        i = 8
+        while i < n - (n % 8):
+            r += values[:, i:i + 8]
+            i += 8
+        res = ((r[:, 0] + r[:, 1]) + (r[:, 2] + r[:, 3])) + ((r[:, 4] + r[:, 5]) + (r[:, 6] + r[:, 7]))
+        for j in range(i, n):
+            res += values[:, j]
+        return res
+    half = n // 2
+    half -= half % 8
+    return pairwise_row_sum(values[:, :half]) + pairwise_row_sum(values[:, half:])
+
+
+class BandReduction(NamedTuple):
+    # How one band table is reduced from spectra on a given frequency axis.
+    # Band powers are summed bin by bin in the per-second order of np.sum and
+    # then multiplied by scale (df for PSD input, otherwise 1).
+    band_bins: Dict[str, np.ndarray]
+    scale: float
+    peak_idx: np.ndarray
+
+
+def prepare_band_reduction(
+    freqs: np.ndarray,
+    table: BandTable,
+    *,
+    use_psd: bool = False,
+) -> BandReduction | None:
+    """
+    Band bins and peak search bins for table on freqs.
+    Returns None when a band has no bins on this frequency axis.
+    """
+    bins: Dict[str, np.ndarray] = {}
+    for feature in table.features:
+        for name in (feature.band, feature.other):
+            if name is not None and feature.kind != "peak" and name not in bins:
+                bins[name] = band_bins(freqs, table.bands[name])
+    if any(idx.size == 0 for idx in bins.values()):
+        return None
+
+    df = float(freqs[1] - freqs[0]) if freqs.size > 1 else 0.0
+    peak_idx = np.flatnonzero((freqs >= PEAK_RANGE[0]) & (freqs <= PEAK_RANGE[1]))
+    return BandReduction(bins, df if use_psd and df > 0.0 else 1.0, peak_idx)
+
+
+def reduce_spectra(
+    power: np.ndarray,
+    freqs: np.ndarray,
+    table: BandTable,
+    reduction: BandReduction,
+) -> np.ndarray:
+    """(spectra x features) values of table from a (spectra x bins) power matrix."""
+    features = np.full((power.shape[0], len(table.features)), np.nan, dtype=float)
+    band_power = {
+        name: pairwise_row_sum(power[:, idx]) * reduction.scale for name, idx in reduction.band_bins.items()
+    }
+    peak_idx = reduction.peak_idx
+    peak_freq = freqs[peak_idx[np.argmax(power[:, peak_idx], axis=1)]] if peak_idx.size > 0 else None
+
+    for col, feature in enumerate(table.features):
+        if feature.kind == "peak":
+            if peak_freq is None:
+                continue
+            band = table.bands[feature.band]
+            upper = peak_freq <= band.high if band.include_high else peak_freq < band.high
+            features[:, col] = np.where((peak_freq >= band.low) & upper, 1.0, 0.0)
+            continue
+
+        p_band = band_power[feature.band]
+        if feature.kind == "power":
+            features[:, col] = p_band
+            continue
+        p_other = band_power[feature.other]
+        if feature.kind == "difference":
+            features[:, col] = p_band - p_other
+        elif feature.kind == "ratio":
+            with np.errstate(divide="ignore", invalid="ignore"):
+                features[:, col] = np.where(p_other > 0.0, p_band / p_other, np.nan)
+        else:
+            raise ValueError(f"Unknown feature kind '{feature.kind}'")
+
+    return features
+
+
+def compute_band_table_features(
     signal: np.ndarray,
     fs: float,
+    table: BandTable = DEFAULT_BAND_TABLE,
     *,
-    theta_low: float,
-    theta_high: float,
-    alpha_low: float,
-    alpha_high: float,
-    beta_low: float,
-    beta_high: float,
     use_psd: bool = False,
-) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    chunk_seconds: int = DEFAULT_CHUNK_SECONDS,
+    window_sec: float | None = None,
+    hop_sec: float | None = None,
+) -> np.ndarray:
+    """
+    Per-epoch features of one channel as an (epochs x features) array, in the
+    order of table.features. Every band is reduced from the same spectra, with
+    the same summation order as a per-second np.sum, so the values match the
+    per-second loop exactly. Epochs containing NaN samples stay NaN.
+    """
+    n_features = len(table.features)
     if signal.size == 0 or fs <= 0:
-        empty = np.array([], dtype=float)
-        return empty, empty, empty, empty, empty, empty, empty, empty, empty
+        return np.empty((0, n_features), dtype=float)
 
-    win = int(round(fs))
-    if win <= 0:
-        empty = np.array([], dtype=float)
-        return empty, empty, empty, empty, empty, empty, empty, empty, empty
+    win, hop = resolve_window(fs, window_sec, hop_sec)
+    if win <= 0 or hop <= 0:
+        return np.empty((0, n_features), dtype=float)
 
-    n_secs = int(signal.size // win)
+    n_secs = count_epochs(int(signal.size), win, hop)
     if n_secs == 0:
-        empty = np.array([], dtype=float)
-        return empty, empty, empty, empty, empty, empty, empty, empty, empty
+        return np.empty((0, n_features), dtype=float)
 
     freqs = np.fft.rfftfreq(win, d=1.0 / fs)
-    theta_mask = (freqs >= theta_low) & (freqs < theta_high)
-    alpha_mask = (freqs >= alpha_low) & (freqs < alpha_high)
-    beta_mask = (freqs >= beta_low) & (freqs <= beta_high)
-    total_mask = (freqs >= 1) & (freqs <= 40)
-
-    if not np.any(theta_mask) or not np.any(alpha_mask) or not np.any(beta_mask):
-        empty = np.array([], dtype=float)
-        return empty, empty, empty, empty, empty, empty, empty, empty, empty
+    reduction = prepare_band_reduction(freqs, table, use_psd=use_psd)
+    if reduction is None:
+        return np.empty((0, n_features), dtype=float)
 
     window = np.hanning(win)
     window_power = float(np.sum(window ** 2))
-    df = float(freqs[1] - freqs[0]) if freqs.size > 1 else 0.0
-    peak_mask = (freqs >= 2.0) & (freqs <= 30.0)
-    theta_power = np.full(n_secs, np.nan, dtype=float)
-    alpha_power = np.full(n_secs, np.nan, dtype=float)
-    beta_power = np.full(n_secs, np.nan, dtype=float)
-    alpha_beta = np.full(n_secs, np.nan, dtype=float)
-    alpha_theta = np.full(n_secs, np.nan, dtype=float)
-    alpha_total = np.full(n_secs, np.nan, dtype=float)
-    alpha_peak = np.full(n_secs, np.nan, dtype=float)
-    alpha_minus_beta = np.full(n_secs, np.nan, dtype=float)
-    alpha_minus_theta = np.full(n_secs, np.nan, dtype=float)
-
-
-    for s in range(n_secs):
-        start = s * win
-        end = start + win
-        seg = signal[start:end]
-        if seg.size < win:
+    features = np.full((n_secs, n_features), np.nan, dtype=float)
+
+    if use_psd and window_power <= 0.0:
+        return features
+
+    # (epochs x win) strided view of the signal, processed in bounded chunks so
+    # the spectra never hold more than chunk_seconds rows at a time.
+    segments = epoch_view(np.asarray(signal, dtype=float), win, hop)
+    chunk_seconds = max(1, int(chunk_seconds))
+
+    for chunk_start in range(0, n_secs, chunk_seconds):
+        block = segments[chunk_start:chunk_start + chunk_seconds]
+        valid = ~np.isnan(block).any(axis=1)
+        if not np.any(valid):
             continue
-        if np.isnan(seg).any():
+        rows = chunk_start + np.flatnonzero(valid)
+        power = segment_power_spectra(block[valid], window, fs, use_psd=use_psd)
+        features[rows] = reduce_spectra(power, freqs, table, reduction)
+
+    return features
+
+
+def compute_epoch_spectra(
+    signal: np.ndarray,
+    fs: float,
+    *,
+    chunk_seconds: int = DEFAULT_CHUNK_SECONDS,
+    window_sec: float | None = None,
+    hop_sec: float | None = None,
+) -> np.ndarray:
+    """
+    Unscaled |FFT|^2 spectra of one channel as an (epochs x bins) array, the
+    input of band_features_from_spectra. Epochs containing NaN samples are NaN rows.
+    """
+    win, hop = resolve_window(fs, window_sec, hop_sec)
+    n_secs = count_epochs(int(signal.size), win, hop) if fs > 0 else 0
+    spectra = np.full((n_secs, win // 2 + 1), np.nan, dtype=float)
+    if n_secs == 0:
+        return spectra
+
+    window = np.hanning(win)
+    segments = epoch_view(np.asarray(signal, dtype=float), win, hop)
+    chunk_seconds = max(1, int(chunk_seconds))
+
+    for chunk_start in range(0, n_secs, chunk_seconds):
+        block = segments[chunk_start:chunk_start + chunk_seconds]
+        valid = ~np.isnan(block).any(axis=1)
+        if np.any(valid):
+            rows = chunk_start + np.flatnonzero(valid)
+            spectra[rows] = segment_power_spectra(block[valid], window, fs)
+
+    return spectra
+
+
+def band_features_from_spectra(
+    spectra: np.ndarray,
+    fs: float,
+    win: int,
+    table: BandTable = DEFAULT_BAND_TABLE,
+    *,
+    use_psd: bool = False,
+    chunk_seconds: int = DEFAULT_CHUNK_SECONDS,
+) -> np.ndarray:
+    """
+    compute_band_table_features from precomputed (epochs x bins) spectra, e.g. a
+    memory-mapped cache entry. PSD scaling is applied here, so the same spectra
+    serve both --psd and plain band powers.
+    """
+    n_secs = int(spectra.shape[0])
+    n_features = len(table.features)
+    freqs = np.fft.rfftfreq(win, d=1.0 / fs)
+    reduction = prepare_band_reduction(freqs, table, use_psd=use_psd)
+    if n_secs == 0 or reduction is None:
+        return np.empty((0, n_features), dtype=float)
+
+    window_power = float(np.sum(np.hanning(win) ** 2))
+    features = np.full((n_secs, n_features), np.nan, dtype=float)
+    if use_psd and window_power <= 0.0:
+        return features
+
+    chunk_seconds = max(1, int(chunk_seconds))
+    for chunk_start in range(0, n_secs, chunk_seconds):
+        block = spectra[chunk_start:chunk_start + chunk_seconds]
+        valid = ~np.isnan(block).any(axis=1)
+        if not np.any(valid):
             continue
-        seg = seg - float(np.mean(seg))
-        seg = seg * window
-        spec = np.fft.rfft(seg)
-        power = np.abs(spec) ** 2
+        rows = chunk_start + np.flatnonzero(valid)
+        power = np.array(block[valid], dtype=float)
         if use_psd:
-            if fs <= 0.0 or window_power <= 0.0:
-                continue
-            power = power / (float(fs) * window_power)
-            # One-sided PSD scaling for real signals:
-            # double all bins except DC (0 Hz) and Nyquist (fs/2, when N even).
-            if win % 2 == 0:
-                if power.size > 2:
-                    power[1:-1] *= 2.0
-            else:
-                if power.size > 1:
-                    power[1:] *= 2.0
-
-        if np.any(peak_mask):
-            peak_rel_idx = int(np.argmax(power[peak_mask]))
-            peak_abs_idx = int(np.flatnonzero(peak_mask)[peak_rel_idx])
-            peak_freq = float(freqs[peak_abs_idx])
-            alpha_peak[s] = 1.0 if (peak_freq >= float(alpha_low) and peak_freq < float(alpha_high)) else 0.0
-
-        p_theta = float(np.sum(power[theta_mask]))
-        p_alpha = float(np.sum(power[alpha_mask]))
-        p_beta = float(np.sum(power[beta_mask]))
-        p_total = float(np.sum(power[total_mask]))
-        if use_psd and df > 0.0:
-            # Convert PSD (power/Hz) to band power by integrating over frequency.
-            p_theta *= df
-            p_alpha *= df
-            p_beta *= df
-            p_total *= df
-
-        theta_power[s] = p_theta
-        alpha_power[s] = p_alpha
-        beta_power[s] = p_beta
-        alpha_minus_beta[s] = p_alpha - p_beta
-        alpha_minus_theta[s] = p_alpha - p_theta
-
-        if p_beta > 0.0:
-            alpha_beta[s] = p_alpha / p_beta
-        if p_theta > 0.0:
-            alpha_theta[s] = p_alpha / p_theta
-        
-        if p_total > 0.0:
-            alpha_total[s] = p_alpha / p_total
-
-    return theta_power, alpha_power, beta_power, alpha_beta, alpha_theta, alpha_total, alpha_minus_beta, alpha_minus_theta, alpha_peak
-
-
-def extract_react_times(edf_path: str) -> Dict[int, float]:
+            scale_to_psd(power, win, fs, window_power)
+        features[rows] = reduce_spectra(power, freqs, table, reduction)
+
+    return features
+
+
+def compute_band_powers_and_ratios_fft(
+    signal: np.ndarray,
+    fs: float,
+    *,
+    theta_low: float,
+    theta_high: float,
+    alpha_low: float,
+    alpha_high: float,
+    beta_low: float,
+    beta_high: float,
+    use_psd: bool = False,
+    chunk_seconds: int = DEFAULT_CHUNK_SECONDS,
+    window_sec: float | None = None,
+    hop_sec: float | None = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    table = build_band_table(
+        bands={
+            "theta": Band("theta", theta_low, theta_high),
+            "alpha": Band("alpha", alpha_low, alpha_high),
+            "beta": Band("beta", beta_low, beta_high, True),
+        }
+    )
+    features = compute_band_table_features(
+        signal,
+        fs,
+        table,
+        use_psd=use_psd,
+        chunk_seconds=chunk_seconds,
+        window_sec=window_sec,
+        hop_sec=hop_sec,
+    )
+    columns = {name: features[:, col] for col, name in enumerate(feature_names(table))}
+    return (
+        columns["theta_power"],
+        columns["alpha_power"],
+        columns["beta_power"],
+        columns["alpha_beta"],
+        columns["alpha_theta"],
+        columns["alpha_total"],
+        columns["alpha_minus_beta"],
+        columns["alpha_minus_theta"],
+        columns["alpha_peak"],
+    )
+
+
+def compute_band_features(
+    signals: np.ndarray,
+    fs: float,
+    table: BandTable = DEFAULT_BAND_TABLE,
+    **kwargs,
+) -> np.ndarray:
     """
-    使用 stage 1->2 的規則，react_time = sec_253 - sec_251。
-    t = sec，sec 為 1-based 秒數。
-    回傳 {second_key: react_time}，second_key = round(sec_251 * 10) 的整數 (1 位小數)。
+    Band features for every channel of a (channels x samples) matrix.
+    Returns a channels x epochs x features array ordered as table.features;
+    keyword arguments are passed to compute_band_table_features.
     """
-    f = pyedflib.EdfReader(edf_path)
-    try:
-        labels = f.getSignalLabels()
-        status_idx = find_channel_index(labels, "status")
-        if status_idx is None:
-            raise ValueError("Status channel not found in EDF.")
-
-        status_signal = f.readSignal(status_idx)
-        fs = float(f.getSampleFrequency(status_idx))
-        if fs <= 0:
-            raise ValueError("Invalid sample rate.")
-
-        total_samples = len(status_signal)
-        total_seconds = int(total_samples // fs)
-
-        stage = 1
-        sec_251 = None
-        events: Dict[int, float] = {}
-
-        for sec in range(1, total_seconds + 1):
-            start = int((sec - 1) * fs)
-            end = int(sec * fs)
-            segment = status_signal[start:end]
-
-            for i in range(len(segment)):
-                if segment[i] > 1:
-                    t = float(sec)
-                    if stage == 1:
-                        sec_251 = t + 0.002 * i
-                        stage = 2
-                    elif stage == 2:
-                        sec_253 = t + 0.002 * i
-                        stage = 3
-                    elif stage == 3:
-                        if sec_251 is not None and sec_253 is not None:
-                            sec_251_round = int(round(sec_251, 0))
-                            react_time = round(sec_253 - sec_251, 1)
-                            key = int(round(sec_251_round * 10))
-                            #print(sec_251, sec_251_round,key, react_time)
-                            if key not in events:
-                                events[key] = react_time
-                        stage = 1
-    finally:
-        f.close()
+    per_channel = [
+        compute_band_table_features(signal, fs, table, **kwargs)
+        for signal in np.atleast_2d(signals)
+    ]
+    return np.stack(per_channel)
 
-    return events
+
+def iter_epoch_buffers(
+    blocks: Iterable[np.ndarray],
+    win: int,
+    hop: int,
+    n_channels: int = 1,
+) -> Iterator[np.ndarray]:
+    """
+    Regroup (channels x samples) blocks into buffers holding only whole epochs,
+    each starting on an epoch boundary. Samples of an unfinished epoch are
+    carried over to the next block.
+    """
+    carry = np.empty((n_channels, 0), dtype=float)
+    skip = 0
+
+    for block in blocks:
+        block = np.atleast_2d(block)
+        if skip:
+            # hop > win leaves a gap between epochs that may span whole blocks.
+            dropped = min(skip, block.shape[1])
+            block = block[:, dropped:]
+            skip -= dropped
+        buf = np.concatenate([carry, block], axis=1) if carry.shape[1] else block
+        n_epochs = count_epochs(int(buf.shape[1]), win, hop)
+        if n_epochs == 0:
+            carry = buf
+            continue
+        yield buf[:, : (n_epochs - 1) * hop + win]
+        consumed = n_epochs * hop
+        skip = max(0, consumed - int(buf.shape[1]))
+        carry = buf[:, consumed:].copy()
 
 
-def apply_ratio_highlights(ws, fieldnames: List[str]) -> None:
-    highlight_columns = [
-        fieldnames.index(name) + 1
-        for name in ("alpha_beta", "alpha_theta")
-        if name in fieldnames
+def compute_band_features_stream(
+    blocks: Iterable[np.ndarray],
+    fs: float,
+    *,
+    table: BandTable = DEFAULT_BAND_TABLE,
+    window_sec: float | None = None,
+    hop_sec: float | None = None,
+    n_channels: int = 1,
+    **kwargs,
+) -> np.ndarray:
+    """
+    compute_band_features over an iterable of (channels x samples) blocks.
+    The result equals running compute_band_features on the concatenated signal.
+    """
+    win, hop = resolve_window(fs, window_sec, hop_sec)
+    results = [
+        compute_band_features(buf, fs, table, window_sec=window_sec, hop_sec=hop_sec, **kwargs)
+        for buf in iter_epoch_buffers(blocks, win, hop, n_channels)
     ]
+    if not results:
+        return np.empty((n_channels, 0, len(table.features)), dtype=float)
+    return np.concatenate(results, axis=1)
 
-    for row_idx in range(2, ws.max_row + 1):
-        for col_idx in highlight_columns:
-            cell = ws.cell(row=row_idx, column=col_idx)
-            try:
-                if float(cell.value) > 1.0:
-                    cell.font = RED_FONT
-            except (TypeError, ValueError):
-                continue
 
+def compute_edf_band_features(
+    edf_path: str | EdfSession,
+    channel_names: List[str],
+    *,
+    block_seconds: int = DEFAULT_BLOCK_SECONDS,
+    **kwargs,
+) -> Tuple[List[str], np.ndarray, float]:
+    """
+    Stream the selected channels of an EDF through the FFT stage block by block.
+    Returns (labels, channels x epochs x features array, fs).
+    """
+    with use_session(edf_path) as session:
+        indices, labels, fs = select_channels(session, channel_names)
+        features = compute_band_features_stream(
+            iter_channel_blocks(session, indices, fs, block_seconds),
+            fs,
+            n_channels=len(indices),
+            **kwargs,
+        )
 
-def merge_react_time_into_xlsx(xlsx_path: str, events: Dict[int, float]) -> None:
-    if not os.path.exists(xlsx_path):
-        raise FileNotFoundError(f"XLSX not found: {xlsx_path}")
+    return labels, features, fs
 
-    wb = load_workbook(xlsx_path)
-    ws = wb.active
-    fieldnames = [cell.value for cell in ws[1] if cell.value is not None]
 
-    if "second" not in fieldnames:
-        raise ValueError("XLSX must contain 'second' column.")
+def compute_edf_band_features_cached(
+    edf_path: str | EdfSession,
+    channel_names: List[str],
+    *,
+    table: BandTable = DEFAULT_BAND_TABLE,
+    use_psd: bool = False,
+    window_sec: float | None = None,
+    hop_sec: float | None = None,
+    block_seconds: int = DEFAULT_BLOCK_SECONDS,
+    chunk_seconds: int = DEFAULT_CHUNK_SECONDS,
+) -> Tuple[List[str], np.ndarray, float]:
+    """
+    compute_edf_band_features through the per-epoch spectrum cache next to the
+    EDF. Channels without a cache entry for this EDF content and window are
+    streamed through the FFT once; all bands are then reduced from the
+    memory-mapped spectra, so later runs with other bands or --psd skip the FFT.
+    """
+    with use_session(edf_path) as session:
+        cache_dir = spectrum_cache_dir(session.path)
+        content_hash = file_content_hash(session.path, cache_dir)
+        indices, labels, fs = select_channels(session, channel_names)
+        prune_stale_entries(cache_dir, content_hash)
+        win, hop = resolve_window(fs, window_sec, hop_sec)
+        # Keyed by channel index: selected channels may share a label.
+        spectra: Dict[int, np.ndarray] = {}
+        for i, label in zip(indices, labels):
+            entry = load_spectra(cache_dir, content_hash, i, label, win, hop)
+            if entry is not None:
+                spectra[i] = entry[0]
+
+        missing = [(i, label) for i, label in zip(indices, labels) if i not in spectra]
+        if missing:
+            n_samples = min(session.n_samples[i] for i, _ in missing)
+            n_epochs = count_epochs(n_samples, win, hop)
+            writers = [
+                SpectraWriter(cache_dir, content_hash, i, label, fs, win, hop, n_epochs)
+                for i, label in missing
+            ]
+            try:
+                blocks = iter_channel_blocks(session, [i for i, _ in missing], fs, block_seconds)
+                for buf in iter_epoch_buffers(blocks, win, hop, len(missing)):
+                    for writer, signal in zip(writers, buf):
+                        writer.append(
+                            compute_epoch_spectra(
+                                signal, fs, chunk_seconds=chunk_seconds, window_sec=window_sec, hop_sec=hop_sec
+                            )
+                        )
+                for writer, (i, _) in zip(writers, missing):
+                    spectra[i] = writer.commit()
+            except BaseException:
+                for writer in writers:
+                    writer.discard()
+                raise
+            print(f"Cached spectra for {', '.join(label for _, label in missing)} in {cache_dir}")
+
+    n_epochs = min(int(spectra[i].shape[0]) for i in indices)
+    features = np.stack(
+        [
+            band_features_from_spectra(
+                spectra[i][:n_epochs], fs, win, table, use_psd=use_psd, chunk_seconds=chunk_seconds
+            )
+            for i in indices
+        ]
+    )
+    return labels, features, fs
 
-    for name in XLSX_FIELDNAMES:
-        if name not in fieldnames:
-            fieldnames.append(name)
 
-    rows: List[Dict[str, float | int | str | None]] = []
-    for row_idx in range(2, ws.max_row + 1):
-        row: Dict[str, float | int | str | None] = {}
-        for col_idx, name in enumerate(fieldnames, start=1):
-            row[name] = ws.cell(row=row_idx, column=col_idx).value
-        rows.append(row)
+def incremental_state_path(output_path: str) -> str:
+    return output_path + ".state.npz"
 
-    def second_to_key(val: float | int | str | None) -> int | None:
-        try:
-            return int(round(float(val) * 10))
-        except Exception:
-            return None
-
-    existing_keys = set()
-    for row in rows:
-        key = second_to_key(row.get("second"))
-        if key is None:
-            continue
-        existing_keys.add(key)
-        if key in events:
-            row["react_time"] = round(events[key], 1)
 
-    for key, react_time in events.items():
-        if key in existing_keys:
-            continue
-        sec_value = key / 10.0
-        new_row = {name: None for name in fieldnames}
-        new_row["second"] = sec_value
-        new_row["react_time"] = round(react_time, 1)
-        rows.append(new_row)
+def load_incremental_state(state_path: str, settings: Dict[str, object]) -> np.ndarray | None:
+    """
+    Features (channels x epochs x features) stored by an earlier incremental
+    run, or None when there is no state or it was made with other settings.
+    """
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with np.load(state_path, allow_pickle=False) as state:
+            stored_settings = json.loads(str(state["settings"]))
+            features = state["features"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: ignoring unreadable incremental state {state_path}: {e}")
+        return None
+    if stored_settings != settings:
+        print(f"Incremental state {state_path} was made with other settings, recomputing from the start")
+        return None
+    return features
+
+
+def save_incremental_state(state_path: str, settings: Dict[str, object], features: np.ndarray) -> None:
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, settings=np.array(json.dumps(settings)), features=features)
+    os.replace(tmp_path, state_path)
+
+
+def compute_edf_band_features_incremental(
+    edf_path: str | EdfSession,
+    channel_names: List[str],
+    state_path: str,
+    *,
+    table: BandTable = DEFAULT_BAND_TABLE,
+    use_psd: bool = False,
+    window_sec: float | None = None,
+    hop_sec: float | None = None,
+    block_seconds: int = DEFAULT_BLOCK_SECONDS,
+    chunk_seconds: int = DEFAULT_CHUNK_SECONDS,
+) -> Tuple[List[str], np.ndarray, float]:
+    """
+    compute_edf_band_features for an EDF that is still being recorded. The
+    features of every complete epoch are kept in state_path; a later run reads
+    the EDF from the first unfinished epoch on and only computes the new epochs.
+    """
+    with use_session(edf_path) as session:
+        edf_name = os.path.basename(session.path)
+        indices, labels, fs = select_channels(session, channel_names)
+        win, hop = resolve_window(fs, window_sec, hop_sec)
+        settings: Dict[str, object] = {
+            "start": session.start_datetime.isoformat(),
+            "labels": labels,
+            "fs": fs,
+            "win": win,
+            "hop": hop,
+            "use_psd": bool(use_psd),
+            "bands": {name: list(band) for name, band in table.bands.items()},
+            "features": [list(feature) for feature in table.features],
+        }
+
+        n_samples = min(session.n_samples[i] for i in indices)
+        previous = load_incremental_state(state_path, settings)
+        if previous is not None and previous.shape[1] > count_epochs(n_samples, win, hop):
+            print(f"{edf_name} is shorter than its incremental state, recomputing from the start")
+            previous = None
+        if previous is None:
+            previous = np.empty((len(labels), 0, len(table.features)), dtype=float)
+
+        n_done = int(previous.shape[1])
+        new_features = compute_band_features_stream(
+            iter_channel_blocks(session, indices, fs, block_seconds, start_sample=n_done * hop),
+            fs,
+            table=table,
+            use_psd=use_psd,
+            window_sec=window_sec,
+            hop_sec=hop_sec,
+            chunk_seconds=chunk_seconds,
+            n_channels=len(indices),
+        )
+
+    features = np.concatenate([previous, new_features], axis=1)
+    save_incremental_state(state_path, settings, features)
+    print(
+        f"{edf_name}: {new_features.shape[1]} new epochs after "
+        f"{n_done} already processed"
+    )
+    return labels, features, fs
+
+
+def extract_react_times(edf_path: str | EdfSession) -> Dict[int, float]:
+    """
+    使用 stage 1->2 的規則，react_time = sec_253 - sec_251。
+    t = sec，sec 為 1-based 秒數。
+    回傳 {second_key: react_time}，second_key = round(sec_251 * 10) 的整數 (1 位小數)。
+    """
+    decoded, fs = read_status_events(edf_path)
+    return react_times_by_second(decoded, fs)
 
-    def sort_key(row: Dict[str, float | int | str | None]) -> float:
-        try:
-            return float(row.get("second", ""))
-        except Exception:
-            return float("inf")
 
-    rows.sort(key=sort_key)
+def react_times_by_second(decoded: np.ndarray, fs: float) -> Dict[int, float]:
+    """
+    extract_react_times 的換算：時間用 1-based 秒數的 sample_clock，
+    以 Python round（對二進位值正確捨入、.5 取偶）取到 0.1 秒，與原本逐秒掃描的結果相同
+    """
+    sec_251 = sample_clock(decoded["start_sample"], fs, first_second=1).tolist()
+    sec_253 = sample_clock(decoded["response_sample"], fs, first_second=1).tolist()
 
-    ws.delete_rows(1, ws.max_row)
-    ws.append(fieldnames)
-    for row in rows:
-        ws.append([row.get(name) for name in fieldnames])
-    apply_ratio_highlights(ws, fieldnames)
-    wb.save(xlsx_path)
+    events: Dict[int, float] = {}
+    for start, response in zip(sec_251, sec_253):
+        key = int(round(round(start) * 10))
+        events.setdefault(key, round(response - start, 1))
+    return events
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description=(
             "Compute per-second theta/alpha/beta FFT band power (or PSD-based band power) and "
-            "alpha/beta, alpha/theta ratios for FP2 channel."
+            "alpha/beta, alpha/theta ratios for the selected channels (FP2 by default)."
         )
     )
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--edf", help="EDF file path")
+    group.add_argument("--input-dir", help="Process every EDF matching --glob in this folder")
 
-    parser.add_argument("--channel", default="FP2", help="Channel name to match (default: FP2)")
+    parser.add_argument(
+        "--glob",
+        default="*.edf",
+        help="File pattern for --input-dir, '**' recurses into subfolders (default: *.edf)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for --input-dir (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="With --input-dir, also reprocess files whose output is newer than the EDF",
+    )
+    parser.add_argument(
+        "--manifest",
+        help=f"Manifest CSV path for --input-dir (default: <input-dir>/{DEFAULT_MANIFEST_NAME})",
+    )
+
+    parser.add_argument(
+        "--channel",
+        nargs="+",
+        default=["FP2"],
+        help=(
+            "Channel name(s) to match, space or comma separated, or 'all' for every "
+            "non-Status channel (default: FP2)"
+        ),
+    )
 
     parser.add_argument("--theta-low", type=float, default=4.0, help="Theta band low cutoff (Hz)")
     parser.add_argument("--theta-high", type=float, default=8.0, help="Theta band high cutoff (Hz)")
@@ -327,6 +939,43 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--alpha-high", type=float, default=13.0, help="Alpha band high cutoff (Hz)")
     parser.add_argument("--beta-low", type=float, default=13.0, help="Beta band low cutoff (Hz)")
     parser.add_argument("--beta-high", type=float, default=30.0, help="Beta band high cutoff (Hz)")
+    parser.add_argument(
+        "--bands",
+        default="",
+        help=(
+            "Extra or overriding bands as name=low-high pairs, e.g. \"sigma=11-16,gamma=30-45\". "
+            "Presets: " + ", ".join(BAND_PRESETS) + "."
+        ),
+    )
+    parser.add_argument(
+        "--features",
+        default=DEFAULT_FEATURES,
+        help=(
+            "Comma separated output features: band (power), a/b (ratio), a-b (difference), "
+            f"band_peak (spectral peak in band). Default: {DEFAULT_FEATURES}"
+        ),
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=1.0,
+        help="FFT window length in seconds (default: 1.0)",
+    )
+    parser.add_argument(
+        "--hop",
+        type=float,
+        default=None,
+        help=(
+            "Hop between consecutive windows in seconds, e.g. --window 2 --hop 0.25 "
+            "(default: same as --window, i.e. non-overlapping epochs)"
+        ),
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(OUTPUT_EXTENSIONS),
+        default="xlsx",
+        help="Output format (default: xlsx). csv/parquet/npz put extra channels in column groups.",
+    )
     parser.add_argument(
         "--psd",
         action="store_true",
@@ -335,6 +984,22 @@ def parse_args() -> argparse.Namespace:
             "Enables window-power normalization and one-sided scaling."
         ),
     )
+    parser.add_argument(
+        "--spectrum-cache",
+        action="store_true",
+        help=(
+            "Keep the per-epoch spectra in a sidecar folder next to the EDF (<edf>_spectra) and "
+            "reuse them, so re-runs with other bands, features or --psd skip the FFT."
+        ),
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "For EDFs that are still being recorded: remember the processed epochs in "
+            "<output>.state.npz and on the next run only read and compute the new data."
+        ),
+    )
 
     return parser.parse_args()
 
@@ -343,108 +1008,337 @@ def sanitize_filename_part(value: str) -> str:
     return "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in value)
 
 
-def default_xlsx_path(edf_path: str, channel_name: str) -> str:
+def default_output_path(edf_path: str, channel_name: str, fmt: str = "xlsx") -> str:
     root, _ = os.path.splitext(edf_path)
     safe_channel = sanitize_filename_part(channel_name)
-    return f"{root}_{safe_channel}.xlsx"
-
-def save_xlsx(
-    output_path: str,
-    rows: List[Dict[str, float | int | str | None]],
-) -> None:
-    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "result"
-    ws.append(XLSX_FIELDNAMES)
-    for row in rows:
-        ws.append([row.get(name) for name in XLSX_FIELDNAMES])
-    apply_ratio_highlights(ws, XLSX_FIELDNAMES)
-    wb.save(output_path)
+    return f"{root}_{safe_channel}{OUTPUT_EXTENSIONS[fmt]}"
 
-def main() -> int:
-    args = parse_args()
-    if not args.edf:
-        print("No EDF file to process.")
-        return 1
-    edf_path = os.path.abspath(args.edf)
+
+def default_xlsx_path(edf_path: str, channel_name: str) -> str:
+    return default_output_path(edf_path, channel_name, "xlsx")
+
+
+def sheet_title(label: str) -> str:
+    # Excel sheet names are limited to 31 characters.
+    return sanitize_filename_part(label)[:31] or "channel"
+
+
+def sheet_titles(labels: List[str]) -> List[str]:
+    """
+    sheet_title for every label, made unique with a "~2", "~3", ... suffix when
+    two labels sanitize or truncate to the same title. Excel compares sheet
+    names case-insensitively.
+    """
+    titles: List[str] = []
+    used = set()
+    for label in labels:
+        base = sheet_title(label)
+        title = base
+        n = 1
+        while title.lower() in used:
+            n += 1
+            suffix = f"~{n}"
+            title = base[: 31 - len(suffix)] + suffix
+        used.add(title.lower())
+        titles.append(title)
+    return titles
+
+
+def build_feature_table(
+    features: np.ndarray,
+    epoch_times: np.ndarray,
+    blink_seconds: List[int] | np.ndarray,
+    table: BandTable = DEFAULT_BAND_TABLE,
+) -> FeatureTable:
+    """
+    Columnar output table for one channel; features is an epochs x features
+    array ordered as table.features.
+    """
+    n_epochs = int(features.shape[0])
+    times = np.asarray(epoch_times[:n_epochs], dtype=float)
+    if np.all(times == np.round(times)):
+        seconds = times.astype(np.int64)
+    else:
+        seconds = np.round(times, 3)
+
+    columns: FeatureTable = {"second": seconds}
+    for col, feature in enumerate(table.features):
+        # Peak flags are 0/1, empty for skipped seconds.
+        columns[feature.name] = nullable_int(features[:, col]) if feature.kind == "peak" else features[:, col]
+    columns["eyeblinking_count"] = rolling_count(
+        blink_seconds, seconds, BLINK_WINDOW_SECONDS, lower_bound=0
+    ).astype(np.int64)
+    columns["react_time"] = np.full(n_epochs, np.nan)
+    return columns
+
+
+def pad_column(values: np.ndarray, n: int) -> np.ndarray:
+    """
+    values followed by n empty cells of the same dtype: NaN for float columns,
+    masked cells for integer columns.
+    """
+    if values.dtype.kind == "f":
+        return np.concatenate([np.ma.getdata(values), np.full(n, np.nan, dtype=values.dtype)])
+    data = np.concatenate([np.ma.getdata(values), np.zeros(n, dtype=values.dtype)])
+    mask = np.concatenate([np.ma.getmaskarray(values), np.ones(n, dtype=bool)])
+    return np.ma.array(data, mask=mask)
+
+
+def merge_react_time_columns(columns: FeatureTable, events: Dict[int, float]) -> FeatureTable:
+    """
+    Join react-time events into a feature table on the decisecond key
+    round(second * 10). Matching rows get react_time; events that fall between
+    epochs are added as rows with only second and react_time, keeping seconds sorted.
+    """
+    merged = dict(columns)
+    if not events:
+        return merged
+
+    event_keys = np.fromiter(events.keys(), dtype=np.int64, count=len(events))
+    event_values = np.array([round(value, 1) for value in events.values()], dtype=float)
+    order = np.argsort(event_keys, kind="stable")
+    event_keys = event_keys[order]
+    event_values = event_values[order]
+
+    row_keys = np.rint(np.asarray(columns["second"], dtype=float) * 10).astype(np.int64)
+    pos = np.searchsorted(event_keys, row_keys)
+    pos_clipped = np.minimum(pos, event_keys.size - 1)
+    hit = (pos < event_keys.size) & (event_keys[pos_clipped] == row_keys)
+
+    react_time = np.array(columns["react_time"], dtype=float)
+    react_time[hit] = event_values[pos_clipped[hit]]
+    merged["react_time"] = react_time
+
+    extra = ~np.isin(event_keys, row_keys)
+    n_extra = int(np.count_nonzero(extra))
+    if n_extra == 0:
+        return merged
+
+    for name, values in merged.items():
+        if name == "second":
+            extra_keys = event_keys[extra]
+            if values.dtype.kind in "iu" and np.all(extra_keys % 10 == 0):
+                merged[name] = np.concatenate([values, extra_keys // 10])
+            else:
+                merged[name] = np.concatenate([np.asarray(values, dtype=float), extra_keys / 10.0])
+        elif name == "react_time":
+            merged[name] = np.concatenate([values, event_values[extra]])
+        else:
+            merged[name] = pad_column(values, n_extra)
+
+    row_order = np.argsort(merged["second"], kind="stable")
+    return {name: values[row_order] for name, values in merged.items()}
+
+
+def band_table_from_args(args: argparse.Namespace) -> BandTable:
+    bands = {
+        "theta": Band("theta", args.theta_low, args.theta_high),
+        "alpha": Band("alpha", args.alpha_low, args.alpha_high),
+        "beta": Band("beta", args.beta_low, args.beta_high, True),
+    }
+    bands.update(parse_band_spec(args.bands))
+    return build_band_table(args.features, bands)
+
+
+def parse_channel_names(values: List[str]) -> List[str]:
+    names: List[str] = []
+    for value in values:
+        names.extend(part.strip() for part in value.split(",") if part.strip())
+    return names
+
+
+def blink_dat_path(edf_path: str) -> str:
+    dat_root, _ = os.path.splitext(edf_path)
+    return dat_root + "_arousal info.dat"
+
+
+def output_path_for(edf_path: str, args: argparse.Namespace) -> str:
+    channel_names = parse_channel_names(args.channel)
+    output_tag = "all" if any(name.lower() == "all" for name in channel_names) else "_".join(channel_names)
+    return default_output_path(edf_path, output_tag, args.format)
+
+
+def process_edf(edf_path: str, args: argparse.Namespace) -> Dict[str, object]:
+    """
+    Compute and save the per-second table of one EDF.
+    Returns a summary with the output path, second counts and elapsed time.
+    """
+    started = time.perf_counter()
+    channel_names = parse_channel_names(args.channel)
+    table = band_table_from_args(args)
 
     total_secs = 0
     total_valid = 0
     total_skipped = 0
-    output_rows: List[Dict[str, float | int | str | None]] = []
-    dat_root, _ = os.path.splitext(edf_path)
-    dat_path = dat_root + "_arousal info.dat"
-    blink_seconds = load_eyeblinkning(dat_path)
-    signal, fs = load_channel_signal(edf_path, args.channel)
-    theta_power, alpha_power, beta_power, alpha_beta, alpha_theta, alpha_total, alpha_minus_beta, alpha_minus_theta, alpha_peak = compute_band_powers_and_ratios_fft(
-        signal,
-        fs,
-        theta_low=args.theta_low,
-        theta_high=args.theta_high,
-        alpha_low=args.alpha_low,
-        alpha_high=args.alpha_high,
-        beta_low=args.beta_low,
-        beta_high=args.beta_high,
-        use_psd=bool(args.psd),
-    )
+    blink_seconds = load_eyeblinkning(blink_dat_path(edf_path))
+    output_path = output_path_for(edf_path, args)
+    options = dict(table=table, use_psd=bool(args.psd), window_sec=args.window, hop_sec=args.hop)
+    # One session for the FFT stage and the Status decoding: the header is
+    # parsed once and every channel is read once.
+    with EdfSession(edf_path) as session:
+        if args.incremental:
+            labels, features, fs = compute_edf_band_features_incremental(
+                session, channel_names, incremental_state_path(output_path), **options
+            )
+        elif args.spectrum_cache:
+            labels, features, fs = compute_edf_band_features_cached(session, channel_names, **options)
+        else:
+            labels, features, fs = compute_edf_band_features(session, channel_names, **options)
+        events = extract_react_times(session)
+    n_secs = int(features.shape[1])
+    epoch_times = epoch_end_seconds(n_secs, fs, args.window, args.hop)
+    multi_channel = len(labels) > 1
+    titles = sheet_titles(labels) if multi_channel else ["result"]
+    tables: Dict[str, FeatureTable] = {}
+
+    for ch_pos, label in enumerate(labels):
+        channel_features = features[ch_pos]
+        valid_mask = ~np.isnan(channel_features).all(axis=1)
+        valid_secs = int(np.sum(valid_mask))
+        skipped = int(n_secs - valid_secs)
+
+        total_secs += n_secs
+        total_valid += valid_secs
+        total_skipped += skipped
+
+        channel_tag = f" [{label}]" if multi_channel else ""
+        print(
+            f"{os.path.basename(edf_path)}{channel_tag}: seconds={n_secs}, "
+            f"valid={valid_secs}, skipped={skipped}"
+        )
 
-    n_secs = int(theta_power.size)
-    valid_mask = ~(np.isnan(theta_power) | np.isnan(alpha_power) | np.isnan(beta_power))
-    valid_secs = int(np.sum(valid_mask))
-    skipped = int(n_secs - valid_secs)
+        tables[titles[ch_pos]] = build_feature_table(channel_features, epoch_times, blink_seconds, table)
 
-    total_secs += n_secs
-    total_valid += valid_secs
-    total_skipped += skipped
+    tables = {title: merge_react_time_columns(columns, events) for title, columns in tables.items()}
+    write_feature_tables(output_path, tables, args.format)
+    print(f"Saved per-second values to: {output_path}")
 
-    print(
-        f"{os.path.basename(edf_path)}: seconds={n_secs}, "
-        f"valid={valid_secs}, skipped={skipped}"
+    return {
+        "edf": edf_path,
+        "output": output_path,
+        "status": "ok",
+        "seconds": total_secs,
+        "valid": total_valid,
+        "skipped": total_skipped,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "error": "",
+    }
+
+
+def is_output_current(edf_path: str, output_path: str) -> bool:
+    """True when the output exists and is newer than the EDF and its blink .dat."""
+    if not os.path.exists(output_path):
+        return False
+    inputs = [edf_path, blink_dat_path(edf_path)]
+    newest_input = max(os.path.getmtime(path) for path in inputs if os.path.exists(path))
+    return os.path.getmtime(output_path) >= newest_input
+
+
+def process_edf_safe(edf_path: str, args: argparse.Namespace) -> Dict[str, object]:
+    # Batch worker entry point: one failing file must not stop the others.
+    started = time.perf_counter()
+    try:
+        return process_edf(edf_path, args)
+    except Exception as e:
+        print(f"Error processing {edf_path}: {e}")
+        return {
+            "edf": edf_path,
+            "output": "",
+            "status": "error",
+            "seconds": 0,
+            "valid": 0,
+            "skipped": 0,
+            "elapsed_s": round(time.perf_counter() - started, 3),
+            "error": str(e),
+        }
+
+
+def find_edf_files(input_dir: str, pattern: str) -> List[str]:
+    return sorted(
+        os.path.abspath(path)
+        for path in glob.glob(os.path.join(input_dir, pattern), recursive=True)
+        if os.path.isfile(path)
     )
 
-    for sec_idx in range(n_secs):
-        t = sec_idx + 1
-        start_range = max(0, t - 30)
-        count = sum(1 for blink in blink_seconds if start_range <= blink <= t)
-        t_val = float(theta_power[sec_idx]) if not np.isnan(theta_power[sec_idx]) else float("nan")
-        a_val = float(alpha_power[sec_idx]) if not np.isnan(alpha_power[sec_idx]) else float("nan")
-        b_val = float(beta_power[sec_idx]) if not np.isnan(beta_power[sec_idx]) else float("nan")
-        ab_val = float(alpha_beta[sec_idx]) if not np.isnan(alpha_beta[sec_idx]) else float("nan")
-        at_val = float(alpha_theta[sec_idx]) if not np.isnan(alpha_theta[sec_idx]) else float("nan")
-        atotal_val = float(alpha_total[sec_idx]) if not np.isnan(alpha_total[sec_idx]) else float("nan")
-        apeak_raw = float(alpha_peak[sec_idx]) if not np.isnan(alpha_peak[sec_idx]) else float("nan")
-        apeak_val = int(round(apeak_raw)) if np.isfinite(apeak_raw) else None
-        a_minus_b_val = float(alpha_minus_beta[sec_idx]) if not np.isnan(alpha_minus_beta[sec_idx]) else float("nan")
-        a_minus_t_val = float(alpha_minus_theta[sec_idx]) if not np.isnan(alpha_minus_theta[sec_idx]) else float("nan")
-
-        output_rows.append({
-            "second": t,
-            "theta_power": t_val,
-            "alpha_power": a_val,
-            "beta_power": b_val,
-            "alpha_beta": ab_val,
-            "alpha_theta": at_val,
-            "alpha_total": atotal_val,
-            "alpha_peak": apeak_val,
-            "alpha_minus_beta": a_minus_b_val,
-            "alpha_minus_theta": a_minus_t_val,
-            "eyeblinking_count": count,
-            "react_time": None,
-        })
 
-    print("--- Summary ---")
-    print(f"Total seconds: {total_secs}")
-    print(f"Valid seconds: {total_valid}")
-    print(f"Skipped seconds (invalid): {total_skipped}")
+def write_manifest(manifest_path: str, results: List[Dict[str, object]]) -> None:
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDNAMES)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({name: result.get(name, "") for name in MANIFEST_FIELDNAMES})
 
-    xlsx_output_path = default_xlsx_path(edf_path, args.channel)
-    save_xlsx(xlsx_output_path, output_rows)
-    events = extract_react_times(edf_path)
-    merge_react_time_into_xlsx(xlsx_output_path, events)
-    print(f"Saved per-second values to: {xlsx_output_path}")
 
-    return 0
+def run_batch(args: argparse.Namespace) -> List[Dict[str, object]]:
+    input_dir = os.path.abspath(args.input_dir)
+    edf_paths = find_edf_files(input_dir, args.glob)
+    if not edf_paths:
+        print(f"No EDF files matching '{args.glob}' in {input_dir}")
+        return []
+
+    results: List[Dict[str, object]] = []
+    pending: List[str] = []
+    for edf_path in edf_paths:
+        output_path = output_path_for(edf_path, args)
+        if not args.force and is_output_current(edf_path, output_path):
+            print(f"{os.path.basename(edf_path)}: up to date, skipped")
+            results.append({"edf": edf_path, "output": output_path, "status": "up-to-date"})
+        else:
+            pending.append(edf_path)
+
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(pending) or 1))
+    if workers == 1:
+        results.extend(process_edf_safe(edf_path, args) for edf_path in pending)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_edf_safe, edf_path, args) for edf_path in pending]
+            results.extend(future.result() for future in futures)
+
+    results.sort(key=lambda result: str(result["edf"]))
+    manifest_path = args.manifest or os.path.join(input_dir, DEFAULT_MANIFEST_NAME)
+    write_manifest(manifest_path, results)
+    print(f"Manifest written to: {manifest_path}")
+    return results
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.edf and not args.input_dir:
+        print("No EDF file to process.")
+        return 1
+    if args.window <= 0 or (args.hop is not None and args.hop <= 0):
+        print("--window and --hop must be positive.")
+        return 1
+
+    if args.incremental and args.spectrum_cache:
+        print("--incremental and --spectrum-cache cannot be combined.")
+        return 1
+
+    if not parse_channel_names(args.channel):
+        print("No channel selected.")
+        return 1
+
+    try:
+        band_table_from_args(args)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    if args.input_dir:
+        results = run_batch(args)
+    else:
+        results = [process_edf(os.path.abspath(args.edf), args)]
+
+    print("--- Summary ---")
+    if args.input_dir:
+        for status in ("ok", "up-to-date", "error"):
+            print(f"Files {status}: {sum(1 for result in results if result['status'] == status)}")
+    print(f"Total seconds: {sum(int(result.get('seconds', 0)) for result in results)}")
+    print(f"Valid seconds: {sum(int(result.get('valid', 0)) for result in results)}")
+    print(f"Skipped seconds (invalid): {sum(int(result.get('skipped', 0)) for result in results)}")
+
+    return 1 if any(result["status"] == "error" for result in results) else 0
 
 
 if __name__ == "__main__":
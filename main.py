@@ -8,6 +8,7 @@ import matplotlib
 from pandas import DataFrame
 from plot_data import *
 from record_status_and_eyeblink_to_xlsx import check_status_253
+from xlsx_cache import read_excel_cached
 
 matplotlib.rcParams["font.sans-serif"] = ["Microsoft JhengHei"]  # 設定中文字體
 matplotlib.rcParams["axes.unicode_minus"] = False  # 解決負號顯示問題
@@ -111,7 +112,7 @@ class AnalysisDataGUI:
         if file_path:
             try:
                 self.file_path = file_path
-                self.df = pd.read_excel(file_path)
+                self.df = read_excel_cached(file_path)
                 self.df = process_data(self.df)
                 self.file_label.config(text=f"已選擇: {file_path.split('/')[-1]}")
                 messagebox.showinfo("成功", "檔案載入成功！")
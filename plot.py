@@ -3,9 +3,10 @@ import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import matplotlib.pyplot as plt
-import pandas as pd
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 
+from xlsx_cache import read_excel_cached
+
 class EEGPlotterGUI:
     def __init__(self, root):
         self.root = root
@@ -51,7 +52,7 @@ class EEGPlotterGUI:
 
     def plot_eeg_data(self, xlsx_file, mode):
         try:
-            df = pd.read_excel(xlsx_file)
+            df = read_excel_cached(xlsx_file)
             eeg_file = os.path.basename(xlsx_file).split('_raw_')[0]
             
             # 建立圖表
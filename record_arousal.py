@@ -1,44 +1,297 @@
+import time
+
+_STARTED = time.perf_counter()
+
 import argparse
 import os
 import sys
-import mne
+from collections import deque
 import numpy as np
-from scipy.signal import find_peaks
+from scipy.signal import butter, find_peaks, firwin, oaconvolve, sosfiltfilt
+
+from edf_session import EdfSession, use_session
+from second_lists import binary_sidecar_path, write_second_list
+
+# mne 只在 --backend mne 時才載入（import 需要數秒），見 import_mne()
+IMPORT_SECONDS = time.perf_counter() - _STARTED
+TIMINGS = {}
+
+# 與 mne.io.read_raw_edf 相同，將物理單位換算為 V（區分大小寫，其他單位不換算）
+UNIT_SCALE = {"uV": 1e-6, "\u00b5V": 1e-6, "\u03bcV": 1e-6, "mV": 1e-3}
+
+# --backend scipy：零相位（sosfiltfilt）Butterworth 帶通濾波器的階數
+SOS_ORDER = 4
+
+# 串流模式：每段讀取的秒數、閾值的滾動視窗長度、峰值判定需要的前後文長度
+STREAM_CHUNK_SECONDS = 60
+THRESHOLD_WINDOW_SECONDS = 300
+PEAK_CONTEXT_SECONDS = 5.0
 
 def get_args():
     parser = argparse.ArgumentParser(description='Detect eye movements from an EDF file')
     parser.add_argument("--file", type=str, help='The path to the EDF file')
+    parser.add_argument("--backend", choices=["mne", "scipy"], default="mne",
+                        help='mne: MNE FIR filter (default); scipy: zero-phase SOS Butterworth filter, no MNE import')
+    parser.add_argument("--timing", action="store_true",
+                        help='Print start-up (import) and processing times')
+    parser.add_argument("--binary", action="store_true",
+                        help='Also write the seconds as an int32 sidecar (eyeblink.i32) for fast loading')
+    parser.add_argument("--stream", action="store_true",
+                        help='Filter and detect chunk by chunk in fixed memory (thresholds from a rolling window)')
+    parser.add_argument("--chunk-seconds", type=float, default=STREAM_CHUNK_SECONDS,
+                        help=f'Seconds read per chunk with --stream (default: {STREAM_CHUNK_SECONDS})')
+    parser.add_argument("--threshold-window", type=float, default=THRESHOLD_WINDOW_SECONDS,
+                        help=f'Rolling threshold window in seconds with --stream (default: {THRESHOLD_WINDOW_SECONDS})')
     return parser.parse_args()
 
-def detect_eye_movements(raw, target_channels, output_path):
-    raw.pick(target_channels)
-    data, times = raw.get_data(), raw.times
-    sfreq = raw.info['sfreq']
-    combined_signal = (np.abs(data[0]) + np.abs(data[1])) / 2
+def import_mne():
+    """延遲載入 mne，並記錄第一次載入的時間"""
+    started = time.perf_counter()
+    import mne
+    TIMINGS.setdefault("import mne", time.perf_counter() - started)
+    return mne
+
+def timed(name, func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    TIMINGS[name] = TIMINGS.get(name, 0.0) + time.perf_counter() - started
+    return result
+
+def print_timings():
+    print(f"啟動（import）：{IMPORT_SECONDS:.3f} 秒")
+    for name, seconds in TIMINGS.items():
+        print(f"{name}：{seconds:.3f} 秒")
+    print(f"總計：{time.perf_counter() - _STARTED:.3f} 秒")
+
+def same_rate_channels(session, channels):
+    """channels 中取樣率與多數通道相同者（依原順序），其餘印出後略過"""
+    if not channels:
+        return []
+    rates = [session.sample_rates[session.labels.index(ch)] for ch in channels]
+    sfreq = max(set(rates), key=rates.count)
+    skipped = [ch for ch, rate in zip(channels, rates) if rate != sfreq]
+    if skipped:
+        print(f"略過取樣率不是 {sfreq:g} Hz 的通道：{', '.join(skipped)}")
+    return [ch for ch, rate in zip(channels, rates) if rate == sfreq]
 
+def read_volts(session, ch_idx):
+    """
+    一個通道的整段訊號（V）。memory-map 的 EDF 與 mne.io.read_raw_edf 逐位元相同：
+    (digital * cal + offset) * 單位，cal、offset 由標頭的物理/數位範圍計算；其他檔案經 pyedflib 讀取
+    """
+    scale = UNIT_SCALE.get(session.dimensions[ch_idx].strip(), 1.0)
+    if session.records is None:
+        return session.signal(ch_idx) * scale
+    layout = session.layout
+    cal = layout.gains[ch_idx]
+    offset = layout.physical_mins[ch_idx] - layout.digital_mins[ch_idx] * cal
+    signal = np.multiply(session.digital(ch_idx), cal).reshape(-1)
+    signal += offset
+    signal *= scale
+    return signal
+
+def load_signals(edf_path, channels=None):
+    """
+    以 EdfSession 讀取通道（不需要 MNE），單位換算為 V
+    edf_path 可以是檔案路徑或已開啟的 EdfSession；channels 為 None 時讀取全部通道，
+    取樣率與多數通道不同的通道會被略過。回傳 (通道 x 樣本資料, 通道名稱, 取樣率)
+    """
+    with use_session(edf_path) as session:
+        channels = same_rate_channels(session, session.labels if channels is None else list(channels))
+        if not channels:
+            raise ValueError(f"{session.path} 沒有可讀取的通道")
+        indices = [session.labels.index(ch) for ch in channels]
+        data = np.vstack([read_volts(session, i) for i in indices])
+        sfreq = session.sample_rates[indices[0]]
+    return data, channels, sfreq
+
+def load_raw(edf_path, channels=None):
+    """
+    以 EdfSession 讀取的資料建立 MNE Raw，取代 mne.io.read_raw_edf(preload=True)
+    與 read_raw_edf 相同，取樣率較低的通道以 mne.filter.resample 升取樣到檔案中最高的取樣率
+    """
+    mne = import_mne()
+    with use_session(edf_path) as session:
+        channels = session.labels if channels is None else list(channels)
+        top = int(np.argmax(session.sample_rates))
+        sfreq, n_times = session.sample_rates[top], session.n_samples[top]
+        data = np.empty((len(channels), n_times))
+        for row, ch in enumerate(channels):
+            signal = read_volts(session, session.labels.index(ch))
+            if signal.size != n_times:
+                signal = mne.filter.resample(signal, n_times, signal.size, npad=0, axis=-1, verbose=False)
+            data[row] = signal
+    info = mne.create_info(channels, sfreq, ch_types="eeg")
+    return mne.io.RawArray(data, info, verbose=False)
+
+def bandpass_sos(data, sfreq, l_freq=1.5, h_freq=10.0, order=SOS_ORDER):
+    """不經過 MNE 的零相位帶通濾波（Butterworth SOS，正反向各一次）"""
+    sos = butter(order, [l_freq, h_freq], btype="bandpass", fs=sfreq, output="sos")
+    return sosfiltfilt(sos, data, axis=-1)
+
+def find_target_channels(labels):
+    return [ch for ch in labels if 'fp1' in ch.lower() or 'fp2' in ch.lower()]
+
+def eye_movement_thresholds(combined_signal):
     # 使用 MAD 方法計算動態閾值
     median = np.median(combined_signal)
     mad = np.median(np.abs(combined_signal - median))
     threshold = median + 3 * mad
     # 動態調整 prominence threshold
     dynamic_prominence = np.percentile(combined_signal, 95)
+    return threshold, dynamic_prominence
+
+def find_eye_movement_peaks(combined_signal, sfreq, threshold, dynamic_prominence, wlen=None):
     peaks, _ = find_peaks(combined_signal, height=threshold, 
                           prominence=dynamic_prominence,
                           distance=int(sfreq * 0.4),
-                          width=(int(sfreq * 0), int(sfreq * 0.5)))
-    eye_move_seconds = np.unique(np.ceil(times[peaks])).astype(int)
-    total_duration = int(times[-1])
-    eye_move_seconds = eye_move_seconds[eye_move_seconds <= total_duration]
-    
+                          width=(int(sfreq * 0), int(sfreq * 0.5)),
+                          wlen=wlen)
+    return peaks
+
+def write_eye_movement_seconds(eye_move_seconds, output_path, binary=False):
     n_count = len(eye_move_seconds)
-    output_data = [n_count] + eye_move_seconds.tolist()
-    output_string = ",".join(map(str, output_data))
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(output_string)
+    write_second_list(eye_move_seconds, output_path, binary=binary)
 
     print(f"處理完成！")
     print(f"總眼動秒數：{n_count}")
     print(f"結果已存入：{output_path}")
+    if binary:
+        print(f"二進位檔已存入：{binary_sidecar_path(output_path)}")
+
+def detect_eye_movements(raw, target_channels, output_path, binary=False):
+    # 只取 raw 中實際存在的通道
+    picks = [ch for ch in target_channels if ch in raw.ch_names]
+    if len(picks) < 2:
+        raise ValueError(f"需要 2 個 FP1/FP2 通道，raw 中只有：{', '.join(picks) or '無'}")
+    raw.pick(picks)
+    detect_eye_movements_from_data(raw.get_data(), raw.info['sfreq'], output_path, binary)
+
+def detect_eye_movements_from_data(data, sfreq, output_path, binary=False):
+    """detect_eye_movements 的核心，data 為已濾波的 (FP1, FP2, ...) x 樣本陣列"""
+    times = np.arange(data.shape[1]) / sfreq
+    combined_signal = (np.abs(data[0]) + np.abs(data[1])) / 2
+
+    threshold, dynamic_prominence = eye_movement_thresholds(combined_signal)
+    peaks = find_eye_movement_peaks(combined_signal, sfreq, threshold, dynamic_prominence)
+    eye_move_seconds = np.unique(np.ceil(times[peaks])).astype(int)
+    total_duration = int(times[-1])
+    eye_move_seconds = eye_move_seconds[eye_move_seconds <= total_duration]
+    
+    write_eye_movement_seconds(eye_move_seconds, output_path, binary)
+
+def design_bandpass_fir(sfreq, l_freq=1.5, h_freq=10.0):
+    """
+    線性相位 FIR 帶通濾波器，與 raw.filter(l_freq, h_freq, fir_design='firwin') 的預設相同：
+    'auto' 過渡帶與長度、hamming 窗；高頻端與低頻端各依自己的過渡帶長度設計一個 firwin 低通，
+    置中後相減（同 MNE 的 _firwin_design）。置中套用時即為零相位濾波
+    """
+    nyq = sfreq / 2.0
+    l_trans = min(max(0.25 * l_freq, 2.0), l_freq)
+    h_trans = min(max(0.25 * h_freq, 2.0), nyq - h_freq)
+    n_taps = int(np.ceil(3.3 / min(l_trans, h_trans) * sfreq))
+    n_taps += (n_taps - 1) % 2  # 奇數長度，延遲為整數個樣本
+    taps = np.zeros(n_taps)
+    # (阻帶邊緣, 通帶邊緣, 正負號)，頻率以 Nyquist 正規化
+    for stop, edge, sign in ((h_freq + h_trans, h_freq, 1.0), (l_freq, l_freq - l_trans, -1.0)):
+        stop, edge = stop / nyq, edge / nyq
+        n = int(round(3.3 / ((stop - edge) / 2.0)))
+        n += 1 - n % 2
+        offset = (n_taps - n) // 2
+        taps[offset:n_taps - offset] += sign * firwin(n, (stop + edge) / 2.0, window="hamming", pass_zero=True, fs=2.0)
+    return taps
+
+def iter_filtered_chunks(session, indices, taps, chunk_samples):
+    """
+    逐段讀取並濾波，每段前後各多讀半個濾波器長度，結果與整段濾波相同；
+    錄音的開頭與結尾以點對稱鏡射延伸（同 MNE 的 pad='reflect_limited'）。產生 (起始樣本, 通道 x 樣本) 的濾波後資料
+    """
+    half = len(taps) // 2
+    n_total = min(session.n_samples[i] for i in indices)
+    for start in range(0, n_total, chunk_samples):
+        end = min(start + chunk_samples, n_total)
+        lo = max(0, start - half)
+        hi = min(n_total, end + half)
+        data = np.vstack([session.read(i, lo, hi - lo) for i in indices])
+        pad = ((0, 0), (half - (start - lo), half - (hi - end)))
+        data = np.pad(data, pad, mode="reflect", reflect_type="odd")
+        yield start, oaconvolve(data, taps[np.newaxis, :], mode="valid", axes=1)
+
+def iter_eye_movement_seconds(
+    session,
+    target_channels,
+    chunk_seconds=STREAM_CHUNK_SECONDS,
+    threshold_window_seconds=THRESHOLD_WINDOW_SECONDS,
+):
+    """
+    串流版的 detect_eye_movements，記憶體用量固定，讀檔的同時逐段產生眼動秒數。
+    - 閾值（中位數 + 3 MAD、95 百分位 prominence）取自最近 threshold_window_seconds 秒
+    - 每個峰值只在其位置之後已有 PEAK_CONTEXT_SECONDS 秒資料時判定一次；
+      跨段時與上一個峰值距離小於 0.4 秒者捨棄，避免重複
+    """
+    indices = [session.labels.index(ch) for ch in target_channels]
+    if len(indices) < 2 or len({session.sample_rates[i] for i in indices}) > 1:
+        raise ValueError("串流模式需要 2 個取樣率相同的 FP1/FP2 通道")
+    sfreq = session.sample_rates[indices[0]]
+    n_total = min(session.n_samples[i] for i in indices)
+    total_duration = int((n_total - 1) / sfreq)
+
+    taps = design_bandpass_fir(sfreq)
+    chunk_samples = max(1, int(round(chunk_seconds * sfreq)))
+    context = int(round(PEAK_CONTEXT_SECONDS * sfreq))
+    distance = int(sfreq * 0.4)
+    window_samples = int(round(threshold_window_seconds * sfreq))
+
+    recent = deque()  # 最近 threshold_window_seconds 秒的 combined signal
+    recent_samples = 0
+    buf = np.empty(0)
+    buf_start = 0
+    decided_to = 0
+    last_peak = None
+    last_second = None
+
+    for start, filtered in iter_filtered_chunks(session, indices, taps, chunk_samples):
+        combined = (np.abs(filtered[0]) + np.abs(filtered[1])) / 2
+
+        recent.append(combined)
+        recent_samples += combined.size
+        while recent_samples - recent[0].size >= window_samples:
+            recent_samples -= recent.popleft().size
+        threshold, dynamic_prominence = eye_movement_thresholds(np.concatenate(recent)[-window_samples:])
+
+        buf = np.concatenate([buf, combined])
+        final = start + combined.size >= n_total
+        decide_to = buf_start + buf.size if final else buf_start + buf.size - context
+        if decide_to <= decided_to:
+            continue
+
+        peaks = find_eye_movement_peaks(buf, sfreq, threshold, dynamic_prominence, wlen=2 * context + 1)
+        peaks = peaks + buf_start
+        peaks = peaks[(peaks >= decided_to) & (peaks < decide_to)]
+        if last_peak is not None:
+            peaks = peaks[peaks - last_peak >= distance]
+        if peaks.size:
+            last_peak = int(peaks[-1])
+
+        seconds = np.unique(np.ceil(peaks / sfreq)).astype(int)
+        seconds = seconds[seconds <= total_duration]
+        if last_second is not None:
+            seconds = seconds[seconds > last_second]
+        if seconds.size:
+            last_second = int(seconds[-1])
+            yield seconds.tolist()
+
+        decided_to = decide_to
+        keep_from = max(buf_start, decided_to - context)
+        buf = buf[keep_from - buf_start:]
+        buf_start = keep_from
+
+def detect_eye_movements_stream(session, target_channels, output_path, binary=False, **kwargs):
+    eye_move_seconds = []
+    for seconds in iter_eye_movement_seconds(session, target_channels, **kwargs):
+        eye_move_seconds.extend(seconds)
+        print(f"已偵測到 {len(eye_move_seconds)} 個眼動秒數（至第 {seconds[-1]} 秒）")
+    write_eye_movement_seconds(eye_move_seconds, output_path, binary)
 
 if __name__ == "__main__":
     args = get_args()
@@ -51,13 +304,41 @@ if __name__ == "__main__":
         sys.exit(1)
     file_dir = os.path.dirname(file_path)
     output_path = os.path.join(file_dir, "eyeblink.dat")
-    raw = mne.io.read_raw_edf(file_path, preload=True)
-
-    raw.filter(1.5, 10, fir_design='firwin')
-    all_channels = raw.ch_names
-    target_channels = [ch for ch in all_channels if 'fp1' in ch.lower() or 'fp2' in ch.lower()]
+    # 只讀取並濾波 FP1/FP2，其他通道不載入
+    with EdfSession(file_path) as session:
+        target_channels = find_target_channels(session.labels)
+        raw = None
+        data = None
+        if len(target_channels) < 2:
+            print("找不到 FP1 或 FP2 通道")
+        elif args.backend == "mne" and not args.stream:
+            # 與 read_raw_edf 相同，不同取樣率的通道會升取樣到最高取樣率
+            import_mne()
+            raw = timed("read", load_raw, session, target_channels)
+        else:
+            # --stream 與 --backend scipy 只讀原始樣本，需要取樣率相同的通道
+            target_channels = same_rate_channels(session, target_channels)
+            if len(target_channels) < 2:
+                print("FP1 與 FP2 通道的取樣率不同，--stream 與 --backend scipy 無法處理，請使用 --backend mne")
+            elif args.stream:
+                timed(
+                    "stream",
+                    detect_eye_movements_stream,
+                    session,
+                    target_channels[:2],
+                    output_path,
+                    binary=args.binary,
+                    chunk_seconds=args.chunk_seconds,
+                    threshold_window_seconds=args.threshold_window,
+                )
+            else:
+                data, _, sfreq = timed("read", load_signals, session, target_channels)
 
-    if len(target_channels) < 2:
-        print("找不到 FP1 或 FP2 通道")
-    else:
-        detect_eye_movements(raw, target_channels, output_path)
\ No newline at end of file
+    if data is not None:
+        data = timed("filter", bandpass_sos, data, sfreq)
+        timed("detect", detect_eye_movements_from_data, data, sfreq, output_path, args.binary)
+    if raw is not None:
+        timed("filter", raw.filter, 1.5, 10, fir_design='firwin')
+        timed("detect", detect_eye_movements, raw, target_channels, output_path, args.binary)
+    if args.timing:
+        print_timings()
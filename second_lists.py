@@ -0,0 +1,112 @@
+import os
+import re
+import warnings
+from typing import Sequence
+
+import numpy as np
+
+# "count, s1, s2, ..." text files (eyeblink.dat, *_alpha.dat, *_arousal info.dat)
+# may have a binary sidecar next to them: the same values, count first, as
+# little-endian int32 in "<dat root>.i32".
+BINARY_SUFFIX = ".i32"
+BINARY_DTYPE = np.dtype("<i4")
+
+# Separators seen in .dat files besides the comma; all are parsed as whitespace.
+_SEPARATORS = str.maketrans({",": " ", ";": " ", "\t": " ", "\r": " ", "\n": " "})
+# Numbers picked out of text the C parser rejects; anything else is skipped.
+_NUMBER_TOKEN = re.compile(r"[-+]?\d+(?:\.\d+)?")
+# How fractional seconds become whole seconds: int(float(s)) or int(round(float(s))).
+ROUNDING_MODES = {"truncate": np.trunc, "round": np.rint}
+
+
+def binary_sidecar_path(dat_path: str | os.PathLike) -> str:
+    root, _ = os.path.splitext(os.fspath(dat_path))
+    return root + BINARY_SUFFIX
+
+
+def parse_second_list(
+    text: str,
+    source: str = "<text>",
+    *,
+    strict: bool = False,
+    rounding: str = "truncate",
+) -> np.ndarray:
+    """
+    Parse "count, s1, s2, ..." with NumPy's C parser. Returns the seconds
+    (without the count) as int64 in file order, made whole by rounding
+    ("truncate" like int(float(s)), "round" like int(round(float(s))), ties
+    to even). Tokens that are not numbers are skipped with a warning; NaN or
+    infinite values raise ValueError. A count that does not match the number
+    of seconds raises ValueError when strict, otherwise it is reported and the
+    seconds are kept.
+    """
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"rounding must be one of {sorted(ROUNDING_MODES)}, got {rounding!r}")
+    text = text.translate(_SEPARATORS).strip()
+    if not text:
+        return np.array([], dtype=np.int64)
+    with warnings.catch_warnings():
+        # Depending on the NumPy version, fromstring warns or raises when it
+        # stops at a token it cannot parse.
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            numbers = np.fromstring(text, dtype=np.float64, sep=" ")
+        except (DeprecationWarning, ValueError):
+            numbers = None
+    if numbers is None:
+        tokens = _NUMBER_TOKEN.findall(text)
+        print(f"Warning: {source}: skipped tokens that are not numbers")
+        numbers = np.array(tokens, dtype=np.float64)
+    if not np.isfinite(numbers).all():
+        raise ValueError(f"{source}: seconds must be finite numbers, found {numbers[~np.isfinite(numbers)][0]}")
+    return _check_count(ROUNDING_MODES[rounding](numbers).astype(np.int64), source, strict)
+
+
+def read_second_list(
+    dat_path: str | os.PathLike,
+    *,
+    strict: bool = False,
+    use_binary: bool = True,
+    rounding: str = "truncate",
+) -> np.ndarray:
+    """
+    Seconds listed in a .dat file, see parse_second_list. The binary sidecar
+    (whole seconds already) is read instead when use_binary is set and it is
+    not older than the text file.
+    """
+    dat_path = os.fspath(dat_path)
+    sidecar = binary_sidecar_path(dat_path)
+    if use_binary and os.path.exists(sidecar):
+        if not os.path.exists(dat_path) or os.path.getmtime(sidecar) >= os.path.getmtime(dat_path):
+            numbers = np.fromfile(sidecar, dtype=BINARY_DTYPE).astype(np.int64)
+            return _check_count(numbers, sidecar, strict)
+    with open(dat_path, "r", encoding="utf-8") as f:
+        return parse_second_list(f.read(), dat_path, strict=strict, rounding=rounding)
+
+
+def write_second_list(
+    seconds: Sequence[int] | np.ndarray,
+    dat_path: str | os.PathLike,
+    *,
+    binary: bool = False,
+) -> None:
+    """Write "count,s1,s2,..." and, when binary is set, the int32 sidecar as well."""
+    values = np.asarray(seconds, dtype=np.int64).ravel()
+    numbers = np.concatenate(([values.size], values))
+    with open(dat_path, "w", encoding="utf-8") as f:
+        f.write(",".join(map(str, numbers.tolist())))
+    if binary:
+        # Written after the text file, so its mtime marks it as up to date.
+        numbers.astype(BINARY_DTYPE).tofile(binary_sidecar_path(dat_path))
+
+
+def _check_count(numbers: np.ndarray, source: str, strict: bool) -> np.ndarray:
+    if numbers.size == 0:
+        return numbers
+    count, seconds = int(numbers[0]), numbers[1:]
+    if count != seconds.size:
+        message = f"{source}: count {count} does not match the {seconds.size} listed seconds"
+        if strict:
+            raise ValueError(message)
+        print(f"Warning: {message}")
+    return seconds
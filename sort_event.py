@@ -1,10 +1,15 @@
 import os
+import numpy as np
 import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+from event_counts import trailing_sum
+from second_lists import read_second_list
+from xlsx_cache import read_excel_cached
+
 # 設定 Matplotlib 字型
 plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
 plt.rcParams['axes.unicode_minus'] = False
@@ -127,15 +132,8 @@ class EEGBrowserGUI:
     def load_dat_counts(self, path):
         """讀取 .dat，排除檔案中的第一個數字，統計每秒次數"""
         try:
-            df = pd.read_csv(path, header=None, sep=None, engine='python')
-            all_data = df.values.flatten()
-            valid_data = all_data[1:]
-            
-            # 4. 轉換為整數秒數並統計頻率
-            s_data = pd.Series(valid_data)
-            s_data = pd.to_numeric(s_data, errors='coerce').dropna().astype(int)
-            
-            return s_data.value_counts().sort_index()
+            seconds, counts = np.unique(read_second_list(path, rounding="truncate"), return_counts=True)
+            return pd.Series(counts, index=seconds, name='count')
         except Exception as e:
             print(f"讀取 .dat 出錯: {e}")
             return pd.Series()
@@ -150,7 +148,7 @@ class EEGBrowserGUI:
             self.root.update()
 
             # 1. 讀取核心 Excel
-            df_main = pd.read_excel(self.path_xlsx.get())
+            df_main = read_excel_cached(self.path_xlsx.get())
             df_main['second'] = pd.to_numeric(df_main['second']).round(2)
             
             # 2. 根據模式處理數據
@@ -172,8 +170,8 @@ class EEGBrowserGUI:
                 master_df = master_df.merge(eye_counts.rename('e_raw'), left_on='second', right_index=True, how='left').fillna(0)
                 
                 # 計算 30 秒滑動累加
-                master_df['alpha_sum'] = master_df['a_raw'].rolling(window=30, min_periods=1).sum()
-                master_df['eye_sum'] = master_df['e_raw'].rolling(window=30, min_periods=1).sum()
+                master_df['alpha_sum'] = trailing_sum(master_df['a_raw'].to_numpy(), 30)
+                master_df['eye_sum'] = trailing_sum(master_df['e_raw'].to_numpy(), 30)
                 try:
                     output_name = "alpha_eye count.xlsx"
                     output_path = os.path.join(os.path.dirname(self.path_xlsx.get()), output_name)
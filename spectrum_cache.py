@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Sidecar folder next to the EDF: "<edf root>_spectra/".
+CACHE_DIR_SUFFIX = "_spectra"
+SOURCE_FILE = "source.json"
+CACHE_VERSION = 2
+# Finished entries: "<content hash>_<channel>_w<win>_h<hop>.npy/.json". Writers
+# fill "<entry>.tmp.npy" first, which never matches.
+ENTRY_PATTERN = re.compile(r"^([0-9a-f]{32})_.+_w\d+_h\d+\.(npy|json)$")
+
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def spectrum_cache_dir(edf_path: str) -> str:
+    root, _ = os.path.splitext(edf_path)
+    return root + CACHE_DIR_SUFFIX
+
+
+def file_content_hash(path: str, cache_dir: str) -> str:
+    """
+    BLAKE2b of the file contents. The digest is remembered in cache_dir together
+    with the file size and mtime, so an unchanged file is not read again.
+    """
+    stat = os.stat(path)
+    source_path = os.path.join(cache_dir, SOURCE_FILE)
+    try:
+        with open(source_path, "r", encoding="utf-8") as f:
+            source = json.load(f)
+        if source.get("size") == stat.st_size and source.get("mtime_ns") == stat.st_mtime_ns:
+            return str(source["content_hash"])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(source_path, "w", encoding="utf-8") as f:
+        json.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content_hash": content_hash}, f)
+    return content_hash
+
+
+def entry_key(content_hash: str, ch_idx: int, label: str, win: int, hop: int) -> str:
+    """Keyed by channel index: channels may share a label."""
+    safe_label = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in label)
+    return f"{content_hash}_{ch_idx}_{safe_label}_w{win}_h{hop}"
+
+
+def load_spectra(
+    cache_dir: str,
+    content_hash: str,
+    ch_idx: int,
+    label: str,
+    win: int,
+    hop: int,
+) -> Tuple[np.ndarray, Dict[str, object]] | None:
+    """
+    Memory-mapped (epochs x bins) spectra and metadata of one cache entry, or
+    None when the entry is missing or incomplete.
+    """
+    base = os.path.join(cache_dir, entry_key(content_hash, ch_idx, label, win, hop))
+    try:
+        with open(base + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        spectra = np.load(base + ".npy", mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CACHE_VERSION or spectra.shape != (meta.get("n_epochs"), len(meta.get("freqs", []))):
+        return None
+    return spectra, meta
+
+
+class SpectraWriter:
+    """
+    Fills a new cache entry epoch by epoch through a memory-mapped .npy file.
+    The entry only becomes visible to load_spectra after commit().
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        content_hash: str,
+        ch_idx: int,
+        label: str,
+        fs: float,
+        win: int,
+        hop: int,
+        n_epochs: int,
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.base = os.path.join(cache_dir, entry_key(content_hash, ch_idx, label, win, hop))
+        self.tmp_path = self.base + ".tmp.npy"
+        freqs = np.fft.rfftfreq(win, d=1.0 / fs)
+        self.spectra = np.lib.format.open_memmap(
+            self.tmp_path, mode="w+", dtype=np.float64, shape=(n_epochs, freqs.size)
+        )
+        self.meta: Dict[str, object] = {
+            "version": CACHE_VERSION,
+            "content_hash": content_hash,
+            "channel": label,
+            "channel_index": int(ch_idx),
+            "fs": float(fs),
+            "win": int(win),
+            "hop": int(hop),
+            "n_epochs": int(n_epochs),
+            "window": "hann",
+            # Spectra are stored as unscaled |FFT|^2 of the mean-removed, windowed epoch.
+            "scaling": "power",
+            "window_power": float(np.sum(np.hanning(win) ** 2)),
+            "freqs": freqs.tolist(),
+        }
+        self.n_written = 0
+
+    def append(self, spectra: np.ndarray) -> None:
+        n = min(int(spectra.shape[0]), self.spectra.shape[0] - self.n_written)
+        self.spectra[self.n_written:self.n_written + n] = spectra[:n]
+        self.n_written += n
+
+    def commit(self) -> np.ndarray:
+        if self.n_written != self.spectra.shape[0]:
+            raise ValueError(
+                f"Spectrum cache entry {self.base} has {self.n_written} of {self.spectra.shape[0]} epochs"
+            )
+        self.spectra.flush()
+        del self.spectra
+        os.replace(self.tmp_path, self.base + ".npy")
+        with open(self.base + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        return np.load(self.base + ".npy", mmap_mode="r")
+
+    def discard(self) -> None:
+        if hasattr(self, "spectra"):
+            del self.spectra
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def prune_stale_entries(cache_dir: str, content_hash: str) -> List[str]:
+    """
+    Remove finished entries computed from an older version of the EDF. Files
+    that are not cache entries, such as another run's in-flight .tmp.npy, are
+    left alone.
+    """
+    removed: List[str] = []
+    if not os.path.isdir(cache_dir):
+        return removed
+    for name in os.listdir(cache_dir):
+        match = ENTRY_PATTERN.match(name)
+        if match is None or match.group(1) == content_hash:
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            # Another run pruned it first.
+            continue
+        removed.append(name)
+    return removed
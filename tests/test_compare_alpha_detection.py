@@ -0,0 +1,142 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import compare_alpha_detection as cad
+
+
+def build_result_row(second, marker_key, source_record=None):
+    row = {"second": second}
+    row.update((key, 1 if marker_key == key else None) for key in cad.RESULT_MARKERS)
+    row.update((key, source_record.get(key) if source_record else None) for key in cad.TABLE_METRICS)
+    return row
+
+
+def two_pointer_compare(dat_seconds, xlsx_positive_records, eye_dat_seconds=None, all_second_records=None):
+    """The original exact-match merge over dict records, kept as the reference for tolerance 0."""
+    dat_list = list(dat_seconds)
+    eye_dat_second_set = set(eye_dat_seconds or [])
+    all_second_records = all_second_records or {}
+    pointer = true_positive = false_positive = miss_positive = 0
+    result_rows = []
+    for record in xlsx_positive_records:
+        second = int(record["second"])
+        while pointer < len(dat_list) and dat_list[pointer] < second:
+            miss_positive += 1
+            result_rows.append(build_result_row(dat_list[pointer], "miss_positive", all_second_records.get(dat_list[pointer])))
+            pointer += 1
+        if pointer < len(dat_list) and dat_list[pointer] == second:
+            true_positive += 1
+            result_rows.append(build_result_row(second, "true_positive", record))
+            pointer += 1
+        elif second not in eye_dat_second_set:
+            false_positive += 1
+            result_rows.append(build_result_row(second, "false_positive", record))
+    while pointer < len(dat_list):
+        miss_positive += 1
+        result_rows.append(build_result_row(dat_list[pointer], "miss_positive", all_second_records.get(dat_list[pointer])))
+        pointer += 1
+    return true_positive, false_positive, miss_positive, result_rows
+
+
+def random_table(rng, n_seconds=400):
+    seconds = np.flatnonzero(rng.random(n_seconds) < 0.7).astype(np.int32)
+    metrics = [rng.normal(1.0, 0.5, seconds.size) for _ in cad.TABLE_METRICS]
+    for values in metrics:
+        values[rng.random(seconds.size) < 0.05] = np.nan
+    return cad.SecondTable(seconds, *metrics)
+
+
+def as_records(table):
+    records = {}
+    for i, second in enumerate(table.second.tolist()):
+        records[second] = {"second": second}
+        for key in cad.TABLE_METRICS:
+            value = float(getattr(table, key)[i])
+            records[second][key] = None if np.isnan(value) else value
+    return records
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_exact_compare_matches_two_pointer_merge(seed):
+    rng = np.random.default_rng(seed)
+    table = random_table(rng)
+    positive = cad.select_positive_records(table)
+    # Sorted dat seconds with a few repeats and seconds outside the table.
+    dat = np.sort(np.concatenate((rng.choice(450, 120), [3, 3, 449]))).tolist()
+    eye = rng.choice(450, 40, replace=False).tolist()
+
+    records = as_records(table)
+    expected = two_pointer_compare(dat, [records[s] for s in positive.second.tolist()], eye, records)
+    true_positive, false_positive, miss_positive, result = cad.compare_seconds(dat, positive, eye, table)
+
+    assert (true_positive, false_positive, miss_positive) == expected[:3]
+    rows = [{key: value for key, value in row.items() if key != "dat_second"} for row in result.rows()]
+    assert rows == expected[3]
+
+    counts = cad.count_outcomes(cad.positive_matrix(table)[0], table, dat, eye)
+    assert tuple(int(count) for count in counts) == expected[:3]
+
+
+def brute_force_matching(detected, reference, tolerance):
+    """(-pairs, total distance, signed total distance) of the best one-to-one matching."""
+    best = None
+    candidates = [[j for j, r in enumerate(reference) if abs(r - d) <= tolerance] + [-1] for d in detected]
+    for choice in itertools.product(*candidates):
+        pairs = [(d, reference[j]) for d, j in zip(detected, choice) if j >= 0]
+        used = [j for j in choice if j >= 0]
+        if len(used) != len(set(used)):
+            continue
+        key = (-len(pairs), sum(abs(r - d) for d, r in pairs), sum(r - d for d, r in pairs))
+        best = key if best is None or key < best else best
+    return best
+
+
+def test_tolerance_prefers_the_exact_second():
+    matched, used = cad.match_seconds(np.array([10]), np.array([9, 10]), 1)
+    assert matched.tolist() == [1]
+    assert used.tolist() == [False, True]
+
+    positive = cad.SecondTable(np.array([10], dtype=np.int32), *(np.ones(1) for _ in cad.TABLE_METRICS))
+    true_positive, false_positive, miss_positive, result = cad.compare_seconds([9, 10], positive, tolerance=1)
+    assert (true_positive, false_positive, miss_positive) == (1, 0, 1)
+    assert result.second.tolist() == [9, 10]
+    assert result.dat_second.tolist() == [9, 10]
+    assert result.marked("true_positive").tolist() == [False, True]
+
+
+def test_tolerance_keeps_the_most_pairs():
+    # An exact-first pass would pair 11 with 11 and leave 10 and 12 unmatched.
+    matched, _ = cad.match_seconds(np.array([10, 11]), np.array([11, 12]), 1)
+    assert matched.tolist() == [0, 1]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_tolerance_matching_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(300):
+        tolerance = int(rng.integers(1, 4))
+        detected = np.sort(rng.choice(20, int(rng.integers(0, 7)), replace=False)).astype(np.int64)
+        reference = np.sort(rng.integers(0, 20, int(rng.integers(0, 7)))).astype(np.int64)
+        matched, used = cad.match_seconds(detected, reference, tolerance)
+
+        hit = matched >= 0
+        assert np.unique(matched[hit]).size == np.count_nonzero(hit) == np.count_nonzero(used)
+        delta = reference[matched[hit]] - detected[hit]
+        assert np.all(np.abs(delta) <= tolerance)
+        key = (-int(np.count_nonzero(hit)), int(np.abs(delta).sum()), int(delta.sum()))
+        assert key == brute_force_matching(detected.tolist(), reference.tolist(), tolerance)
+
+
+def test_tolerance_counts_match_compare_seconds():
+    rng = np.random.default_rng(7)
+    table = random_table(rng)
+    dat = np.sort(rng.choice(450, 150, replace=False)).tolist()
+    eye = rng.choice(450, 40, replace=False).tolist()
+    betas = np.quantile(table.alpha_minus_beta[~np.isnan(table.alpha_minus_beta)], [0.2, 0.5, 0.8])
+    positive = cad.positive_matrix(table, betas, betas)
+    counts = cad.count_outcomes(positive, table, dat, eye, tolerance=2, eye_tolerance=1)
+    for row, (beta, theta) in enumerate(zip(betas, betas)):
+        expected = cad.compare_seconds(dat, cad.select_positive_records(table, beta, theta), eye, tolerance=2, eye_tolerance=1)
+        assert tuple(int(count[row]) for count in counts) == expected[:3]
@@ -0,0 +1,139 @@
+from datetime import datetime
+
+import numpy as np
+import pyedflib
+import pytest
+from pyedflib import highlevel
+
+from edf_session import EdfSession
+
+RATES = [256, 128, 100]
+SECONDS = 12
+
+
+@pytest.fixture(scope="module")
+def edf_path(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    signals = [rng.uniform(-250.0, 250.0, rate * SECONDS) for rate in RATES]
+    headers = highlevel.make_signal_headers(
+        ["FP1", "FP2", "Status"], dimension="uV", sample_frequency=RATES[0],
+        physical_min=-300.0, physical_max=300.0,
+    )
+    for header, rate in zip(headers, RATES):
+        header["sample_frequency"] = rate
+    # Status uses an asymmetric range so the digital offset is not zero.
+    headers[2].update(physical_min=0.0, physical_max=1000.0, digital_min=-32768, digital_max=32767)
+    signals[2] = rng.uniform(0.0, 1000.0, RATES[2] * SECONDS)
+    path = str(tmp_path_factory.mktemp("edf") / "session.edf")
+    highlevel.write_edf(path, signals, headers)
+    return path
+
+
+def read_pyedflib(path, ch_idx, start=0, n=None):
+    # pyedflib cannot open a file twice, so call this before opening a session.
+    reader = pyedflib.EdfReader(path)
+    try:
+        n_total = int(reader.getNSamples()[ch_idx])
+        n = n_total - start if n is None else max(0, min(n, n_total - start))
+        return reader.readSignal(ch_idx, start, n)
+    finally:
+        reader.close()
+
+
+def test_session_is_memory_mapped(edf_path):
+    with EdfSession(edf_path) as session:
+        assert session.records is not None
+        assert session.labels == ["FP1", "FP2", "Status"]
+        assert session.n_samples == [rate * SECONDS for rate in RATES]
+
+
+@pytest.mark.parametrize("ch_idx", range(len(RATES)))
+def test_whole_signal_matches_pyedflib(edf_path, ch_idx):
+    expected = read_pyedflib(edf_path, ch_idx)
+    with EdfSession(edf_path) as session:
+        np.testing.assert_array_equal(session.signal(ch_idx), expected)
+
+
+@pytest.mark.parametrize("start, n", [(0, 1), (5, 300), (255, 2), (1000, 777), (2900, 500)])
+def test_partial_reads_match_pyedflib(edf_path, start, n):
+    expected = [read_pyedflib(edf_path, ch_idx, start, n) for ch_idx in range(len(RATES))]
+    with EdfSession(edf_path) as session:
+        for ch_idx, want in enumerate(expected):
+            np.testing.assert_array_equal(session.read(ch_idx, start, n), want)
+            out = np.empty(want.size)
+            assert session.read(ch_idx, start, n, out=out) is out
+            np.testing.assert_array_equal(out, want)
+
+
+def test_digital_view_is_zero_copy(edf_path):
+    with EdfSession(edf_path) as session:
+        view = session.digital(0)
+        assert view.dtype == np.int16
+        assert view.shape == (SECONDS, RATES[0])
+        assert np.shares_memory(view, session.records)
+        gain, digital_offset = session.scaling(0)
+        np.testing.assert_array_equal(gain * (digital_offset + view.reshape(-1).astype(np.float64)), session.signal(0))
+
+
+def test_cached_signal_is_read_only(edf_path):
+    with EdfSession(edf_path) as session:
+        signal = session.signal(1)
+        assert session.signal(1) is signal
+        with pytest.raises(ValueError):
+            signal[0] = 0.0
+        np.testing.assert_array_equal(session.read(1, 10, 20), signal[10:30])
+
+
+def test_header_fields_match_pyedflib(tmp_path):
+    start = datetime(2024, 3, 5, 14, 7, 9)
+    path = str(tmp_path / "subsecond.edf")
+    headers = highlevel.make_signal_headers(["FP1", "FP2"], dimension="uV", sample_frequency=250)
+    highlevel.write_edf(path, [np.zeros(250 * 4), np.ones(250 * 4)], headers, highlevel.make_header(startdate=start))
+    # pyedflib does not write a sub-second start; shift every record's TAL onset by 0.25 s.
+    with open(path, "r+b") as f:
+        data = bytearray(f.read())
+        header_bytes = int(data[184:192])
+        record_bytes = 2 * (250 + 250)
+        tal_bytes = (len(data) - header_bytes) // 4 - record_bytes
+        for k in range(4):
+            tal = header_bytes + k * (record_bytes + tal_bytes) + record_bytes
+            onset = b"+%d.25\x14\x14" % k
+            data[tal:tal + tal_bytes] = onset + bytes(tal_bytes - len(onset))
+        f.seek(0)
+        f.write(data)
+    start = start.replace(microsecond=250000)
+
+    reader = pyedflib.EdfReader(path)
+    try:
+        n = reader.signals_in_file
+        expected = (
+            list(reader.getSignalLabels()),
+            [float(reader.getSampleFrequency(i)) for i in range(n)],
+            [int(v) for v in reader.getNSamples()],
+            [reader.getPhysicalDimension(i) for i in range(n)],
+        )
+    finally:
+        reader.close()
+    with EdfSession(path) as session:
+        assert session.reader is None
+        got = (session.labels, session.sample_rates, session.n_samples, session.dimensions)
+        assert session.start_datetime == start
+    assert got == expected
+
+
+def test_file_still_being_recorded(edf_path, tmp_path):
+    # A recorder writes -1 as the record count until the file is closed;
+    # pyedflib refuses such a header, so the session must not open it.
+    expected = [read_pyedflib(edf_path, ch_idx) for ch_idx in range(len(RATES))]
+    with open(edf_path, "rb") as f:
+        data = bytearray(f.read())
+    data[236:244] = b"-1      "
+    path = str(tmp_path / "growing.edf")
+    with open(path, "wb") as f:
+        f.write(data)
+    with EdfSession(path) as session:
+        assert session.reader is None
+        assert session.n_samples == [rate * SECONDS for rate in RATES]
+        assert session.sample_rates == [float(rate) for rate in RATES]
+        for ch_idx, want in enumerate(expected):
+            np.testing.assert_array_equal(session.signal(ch_idx), want)
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+import fft_band_ratios_fp2 as fft
+
+BANDS = dict(theta_low=4.0, theta_high=8.0, alpha_low=8.0, alpha_high=13.0, beta_low=13.0, beta_high=30.0)
+
+
+def per_second_band_powers(signal, fs, *, theta_low, theta_high, alpha_low, alpha_high, beta_low, beta_high, use_psd=False):
+    """The original per-second loop, kept as the reference for the batched engine."""
+    win = int(round(fs))
+    n_secs = int(signal.size // win)
+    freqs = np.fft.rfftfreq(win, d=1.0 / fs)
+    theta_mask = (freqs >= theta_low) & (freqs < theta_high)
+    alpha_mask = (freqs >= alpha_low) & (freqs < alpha_high)
+    beta_mask = (freqs >= beta_low) & (freqs <= beta_high)
+    total_mask = (freqs >= 1) & (freqs <= 40)
+    window = np.hanning(win)
+    window_power = float(np.sum(window ** 2))
+    df = float(freqs[1] - freqs[0]) if freqs.size > 1 else 0.0
+    peak_mask = (freqs >= 2.0) & (freqs <= 30.0)
+    out = np.full((9, n_secs), np.nan)
+
+    for s in range(n_secs):
+        seg = signal[s * win:(s + 1) * win]
+        if np.isnan(seg).any():
+            continue
+        seg = (seg - float(np.mean(seg))) * window
+        power = np.abs(np.fft.rfft(seg)) ** 2
+        if use_psd:
+            power = power / (float(fs) * window_power)
+            if win % 2 == 0:
+                power[1:-1] *= 2.0
+            else:
+                power[1:] *= 2.0
+
+        peak_abs_idx = int(np.flatnonzero(peak_mask)[int(np.argmax(power[peak_mask]))])
+        peak_freq = float(freqs[peak_abs_idx])
+        out[8, s] = 1.0 if alpha_low <= peak_freq < alpha_high else 0.0
+
+        p_theta = float(np.sum(power[theta_mask]))
+        p_alpha = float(np.sum(power[alpha_mask]))
+        p_beta = float(np.sum(power[beta_mask]))
+        p_total = float(np.sum(power[total_mask]))
+        if use_psd and df > 0.0:
+            p_theta *= df
+            p_alpha *= df
+            p_beta *= df
+            p_total *= df
+
+        out[0, s], out[1, s], out[2, s] = p_theta, p_alpha, p_beta
+        out[6, s] = p_alpha - p_beta
+        out[7, s] = p_alpha - p_theta
+        if p_beta > 0.0:
+            out[3, s] = p_alpha / p_beta
+        if p_theta > 0.0:
+            out[4, s] = p_alpha / p_theta
+        if p_total > 0.0:
+            out[5, s] = p_alpha / p_total
+    return tuple(out)
+
+
+def make_signal(fs, seconds=60, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(fs * seconds)) / fs
+    signal = 3e-5 * np.sin(2 * np.pi * 10.0 * t) + 1e-5 * rng.standard_normal(t.size)
+    # A gap of NaN samples spanning parts of three seconds.
+    signal[int(fs * 7.5):int(fs * 9.2)] = np.nan
+    return signal
+
+
+@pytest.mark.parametrize("fs", [100.0, 256.0, 257.0, 500.0])
+@pytest.mark.parametrize("use_psd", [False, True])
+@pytest.mark.parametrize("chunk_seconds", [1, 7, fft.DEFAULT_CHUNK_SECONDS])
+def test_batched_matches_per_second_loop(fs, use_psd, chunk_seconds):
+    signal = make_signal(fs)
+    expected = per_second_band_powers(signal, fs, use_psd=use_psd, **BANDS)
+    actual = fft.compute_band_powers_and_ratios_fft(signal, fs, use_psd=use_psd, chunk_seconds=chunk_seconds, **BANDS)
+
+    assert len(actual) == 9
+    for got, want in zip(actual, expected):
+        np.testing.assert_array_equal(got, want)
+    assert np.isnan(actual[0][7:10]).all()
+
+
+def test_default_epochs_are_whole_seconds():
+    seconds = fft.epoch_end_seconds(4, 256.5)
+    assert seconds.dtype == np.int64
+    assert seconds.tolist() == [1, 2, 3, 4]
+    np.testing.assert_allclose(fft.epoch_end_seconds(3, 256.0, 2.0, 0.25), [2.0, 2.25, 2.5])
+
+
+def test_band_table_features_match_nine_arrays():
+    fs = 256.0
+    signal = make_signal(fs, seed=1)
+    features = fft.compute_band_table_features(signal, fs, fft.DEFAULT_BAND_TABLE)
+    expected = per_second_band_powers(signal, fs, **BANDS)
+    columns = dict(zip(fft.feature_names(fft.DEFAULT_BAND_TABLE), features.T))
+    names = ["theta_power", "alpha_power", "beta_power", "alpha_beta", "alpha_theta",
+             "alpha_total", "alpha_minus_beta", "alpha_minus_theta", "alpha_peak"]
+    for name, want in zip(names, expected):
+        np.testing.assert_array_equal(columns[name], want)
+
+
+def test_pairwise_row_sum_matches_numpy_sum():
+    rng = np.random.default_rng(2)
+    for width in (1, 5, 8, 9, 31, 128, 129, 1000):
+        values = rng.standard_normal((4, width)) * 10.0 ** rng.integers(-8, 8, (4, width))
+        expected = np.array([np.sum(row) for row in values])
+        np.testing.assert_array_equal(fft.pairwise_row_sum(values), expected)
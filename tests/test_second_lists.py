@@ -0,0 +1,38 @@
+import re
+
+import numpy as np
+import pytest
+
+from second_lists import parse_second_list, read_second_list, write_second_list
+
+
+def baseline_compare_tokens(text):
+    # The old compare_alpha_detection parser.
+    return [int(round(float(token))) for token in re.findall(r"[-+]?\d+(?:\.\d+)?", text)]
+
+
+def test_rounding_modes():
+    text = "6, 1.5, 2.5, 3.7, -0.5, 4.49, 10"
+    assert parse_second_list(text, rounding="truncate").tolist() == [int(float(p)) for p in text.split(",")[1:]]
+    assert parse_second_list(text, rounding="round").tolist() == baseline_compare_tokens(text)[1:]
+    with pytest.raises(ValueError):
+        parse_second_list(text, rounding="floor")
+
+
+def test_junk_tokens_are_skipped_like_the_old_regex(capsys):
+    text = "4, 12, 13s, abc; 15.6,\t 17"
+    assert parse_second_list(text, "x.dat", rounding="round").tolist() == baseline_compare_tokens(text)[1:]
+    assert "x.dat" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("token", ["nan", "inf", "-inf", "1e999"])
+def test_non_finite_values_are_rejected(token):
+    with pytest.raises(ValueError, match="finite"):
+        parse_second_list(f"3, 1, {token}, 4")
+
+
+def test_binary_sidecar_round_trip(tmp_path):
+    path = tmp_path / "x_alpha.dat"
+    write_second_list([3, 9, 27], path, binary=True)
+    assert read_second_list(path).tolist() == [3, 9, 27]
+    assert read_second_list(path, use_binary=False, rounding="round").tolist() == [3, 9, 27]
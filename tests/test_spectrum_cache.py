@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+import spectrum_cache as sc
+
+OLD = "0" * 32
+NEW = "f" * 32
+
+
+def touch(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{}")
+
+
+def test_prune_removes_only_finished_stale_entries(tmp_path):
+    stale = [f"{OLD}_0_FP1_w500_h500.npy", f"{OLD}_0_FP1_w500_h500.json"]
+    kept = [
+        f"{OLD}_1_FP2_w500_h500.tmp.npy",  # another run still writing
+        f"{NEW}_0_FP1_w500_h500.npy",
+        f"{NEW}_0_FP1_w500_h500.json",
+        sc.SOURCE_FILE,
+        "notes.json",
+        "other.npy",
+    ]
+    for name in stale + kept:
+        touch(tmp_path / name)
+
+    assert sorted(sc.prune_stale_entries(str(tmp_path), NEW)) == sorted(stale)
+    assert sorted(os.listdir(tmp_path)) == sorted(kept)
+
+
+def test_channels_sharing_a_label_get_separate_entries(tmp_path):
+    cache_dir = str(tmp_path)
+    for ch_idx, value in ((0, 1.0), (3, 2.0)):
+        writer = sc.SpectraWriter(cache_dir, NEW, ch_idx, "EEG", 100.0, 100, 100, 2)
+        writer.append(np.full((2, 51), value))
+        writer.commit()
+
+    for ch_idx, value in ((0, 1.0), (3, 2.0)):
+        spectra, meta = sc.load_spectra(cache_dir, NEW, ch_idx, "EEG", 100, 100)
+        assert meta["channel_index"] == ch_idx
+        assert np.all(spectra == value)
+    assert sc.load_spectra(cache_dir, NEW, 1, "EEG", 100, 100) is None
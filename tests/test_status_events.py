@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from fft_band_ratios_fp2 import react_times_by_second
+from status_events import decode_status_events, sample_clock
+
+FS = 500
+
+
+def baseline_react_times(status, fs=FS):
+    """The original per-second scan of extract_react_times (single-sample triggers)."""
+    events = {}
+    stage = 1
+    for sec in range(1, int(len(status) // fs) + 1):
+        segment = status[int((sec - 1) * fs):int(sec * fs)]
+        for i in np.flatnonzero(segment > 1).tolist():
+            t = float(sec) + 0.002 * i
+            if stage == 1:
+                sec_251, stage = t, 2
+            elif stage == 2:
+                sec_253, stage = t, 3
+            else:
+                key = int(round(int(round(sec_251, 0)) * 10))
+                events.setdefault(key, round(sec_253 - sec_251, 1))
+                stage = 1
+    return events
+
+
+def baseline_status_rows(status, fs=FS):
+    """The original record_status_and_eyeblink_to_xlsx scan: (秒數, 反應時間, 導回車道用時)."""
+    rows = []
+    stage = 1
+    for sec in range(len(status) // fs):
+        for i in np.flatnonzero(status[sec * fs:(sec + 1) * fs] > 1).tolist():
+            if stage == 1:
+                sec_251, stage = sec + 0.002 * i, 2
+            elif stage == 2:
+                sec_253, stage = sec + 0.002 * i, 3
+            else:
+                sec_254 = sec + 0.002 * i
+                rows.append((float(f"{sec_251:.1f}"), float(f"{sec_253 - sec_251:.1f}"), float(f"{sec_254 - sec_253:.1f}")))
+                stage = 1
+    return rows
+
+
+def status_with_triggers(samples, n_seconds):
+    status = np.zeros(n_seconds * FS)
+    status[np.asarray(samples)] = 5.0
+    return status
+
+
+@pytest.mark.parametrize("difference", [25, 175, 525, 1225])  # 0.05, 0.35, 1.05 and 2.45 s
+def test_react_time_ties_match_baseline(difference):
+    # The same sample difference rounds either way depending on where the
+    # triggers fall inside their seconds, exactly as the old scan did.
+    starts = np.arange(0, 600 * FS, 3 * FS + 37)[:150]
+    samples = np.column_stack((starts, starts + difference, starts + difference + 300)).reshape(-1)
+    status = status_with_triggers(samples, 620)
+
+    events = decode_status_events(status, FS)
+    assert react_times_by_second(events, FS) == baseline_react_times(status)
+    rows = [
+        (float(f"{e['start']:.1f}"), float(f"{e['response'] - e['start']:.1f}"), float(f"{e['end'] - e['response']:.1f}"))
+        for e in events
+    ]
+    assert rows == baseline_status_rows(status)
+
+
+def test_react_times_match_baseline_at_random_positions():
+    rng = np.random.default_rng(0)
+    # Single-sample triggers: no two in adjacent samples.
+    samples = np.sort(rng.choice(450 * FS, 600, replace=False)) * 2
+    status = status_with_triggers(samples, 900)
+    events = decode_status_events(status, FS)
+    assert react_times_by_second(events, FS) == baseline_react_times(status)
+
+
+def test_sample_clock_seconds_and_offsets():
+    samples = np.array([0, 1, 499, 500, 1001])
+    np.testing.assert_array_equal(sample_clock(samples, 500), [0.0, 0.002, 0.998, 1.0, 2.002])
+    np.testing.assert_array_equal(sample_clock(samples, 500, first_second=1), [1.0, 1.002, 1.998, 2.0, 3.002])
+    # Non-integer rate: second k starts at sample int(k * fs).
+    np.testing.assert_allclose(sample_clock(np.array([255, 256, 512, 513]), 256.5), [255 / 256.5, 1.0, 1.0 + 256 / 256.5, 2.0])
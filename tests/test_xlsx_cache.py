@@ -0,0 +1,56 @@
+import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from xlsx_cache import read_excel_cached, read_xlsx_columns, unique_headers
+
+HEADER = ["second", 1, 2.0, 1.5, None, "x", "x", "x.1", "x", True, 1, "1", " sp ", "Unnamed: 4"]
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XLSX_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def save_workbook(path, header, rows, active_title=None):
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.append(header)
+    for row in rows:
+        worksheet.append(row)
+    if active_title is not None:
+        other = workbook.create_sheet(active_title)
+        other.append(["active", 3])
+        other.append([1, 2])
+        workbook.active = 1
+    workbook.save(path)
+    return str(path)
+
+
+def test_headers_match_read_excel(tmp_path, cache_dir):
+    rows = [[r, r * 2, 0.5, "a", None, r, None, "t", 3.25, False, 7, 8, 9, 1] for r in range(4)]
+    path = save_workbook(tmp_path / "h.xlsx", HEADER, rows, active_title="other")
+    expected = pd.read_excel(path)
+    for _ in range(2):
+        # Parsed on the first read, memory-mapped from the cache on the second.
+        pd.testing.assert_frame_equal(read_excel_cached(path), expected)
+    assert list(read_xlsx_columns(path)) == ["active", 3]
+
+
+def test_datetime_header_is_kept(tmp_path, cache_dir):
+    path = save_workbook(tmp_path / "d.xlsx", [datetime.datetime(2024, 1, 2), "a"], [[1, 2]])
+    for _ in range(2):
+        pd.testing.assert_frame_equal(read_excel_cached(path), pd.read_excel(path))
+
+
+@pytest.mark.parametrize("header", [
+    ["a", "a", "a.1", "a"],
+    ["a.1", "a", "a", None, "Unnamed: 3", None],
+    [1, "1", 1.0, "1.1", 1],
+])
+def test_unique_headers_like_pandas(tmp_path, header):
+    path = save_workbook(tmp_path / "u.xlsx", header, [list(range(len(header)))])
+    assert unique_headers(header) == list(pd.read_excel(path).columns)
@@ -0,0 +1,260 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from typing import Dict, Hashable, List, Sequence
+
+import numpy as np
+from openpyxl import load_workbook
+
+# Column sidecars of parsed workbooks, shared by every tool. One entry per
+# (path, mtime, size); the least recently used entries are removed once the
+# directory grows past the size limit.
+CACHE_DIR_ENV = "XLSX_CACHE_DIR"
+CACHE_MAX_BYTES_ENV = "XLSX_CACHE_MAX_BYTES"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "eeg_xlsx_columns")
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 3
+META_FILE = "meta.json"
+OBJECTS_FILE = "objects.json"
+
+CACHED_EXTENSIONS = (".xlsx", ".xlsm")
+
+# An ordered mapping of column name -> 1-D array, like feature_writers.FeatureTable.
+# Names are the header cells as pandas.read_excel labels them (not always str).
+XlsxColumns = Dict[Hashable, np.ndarray]
+
+
+def xlsx_cache_dir() -> str:
+    return os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+
+
+def xlsx_cache_max_bytes() -> int:
+    value = os.environ.get(CACHE_MAX_BYTES_ENV)
+    return int(value) if value else DEFAULT_CACHE_MAX_BYTES
+
+
+def entry_key(path: str, stat: os.stat_result, active_sheet: bool = True) -> str:
+    sheet = "active" if active_sheet else "first"
+    source = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{sheet}|{CACHE_VERSION}"
+    return hashlib.blake2b(source.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def unique_headers(header_row: Sequence[object]) -> List[Hashable]:
+    """
+    Column names as pandas.read_excel names them: the header cell itself
+    (whole floats as int), "Unnamed: i" for blanks and "name.1", "name.2" for
+    repeats, deduplicated like pandas' header parser (named columns first,
+    skipping suffixes that are already header names).
+    """
+    names: List[Hashable] = []
+    unnamed: List[int] = []
+    for i, value in enumerate(header_row):
+        if value is None or value == "":
+            value = f"Unnamed: {i}"
+            unnamed.append(i)
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        names.append(value)
+
+    counts: Dict[Hashable, int] = defaultdict(int)
+    for i in [i for i in range(len(names)) if i not in unnamed] + unnamed:
+        name = original = names[i]
+        count = counts[name]
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            count = count + 1 if name in names else counts[name]
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def column_array(values: List[object]) -> np.ndarray:
+    """
+    Same dtypes as pandas.read_excel: int64 when every cell is a whole number,
+    float64 (NaN for blanks) when every cell is a number or blank, bool for
+    all-boolean columns (float64 when some are blank), datetime64 (NaT for
+    blanks) for date columns, object otherwise with NaN for blanks.
+    """
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, bool) for value in present):
+        if len(present) == len(values):
+            return np.array(values, dtype=bool)
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        if values and all(isinstance(value, int) or (value is not None and value.is_integer()) for value in values):
+            return np.array(values, dtype=np.int64)
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if all(isinstance(value, datetime.datetime) for value in present):
+        return np.array(["NaT" if value is None else value for value in values], dtype="datetime64[us]")
+    return np.array([np.nan if value is None else value for value in values], dtype=object)
+
+
+def parse_xlsx_columns(xlsx_path: str, active_sheet: bool = True) -> XlsxColumns:
+    """
+    Active worksheet (first worksheet, like pandas.read_excel, when not
+    active_sheet) of a workbook as columns; the first row is the header.
+    """
+    workbook = load_workbook(xlsx_path, data_only=True, read_only=True)
+    try:
+        worksheet = workbook.active if active_sheet else workbook.worksheets[0]
+        rows = [list(row) for row in worksheet.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+    if not rows:
+        return {}
+    header_row, rows = rows[0], rows[1:]
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    width = max([len(header_row)] + [len(row) for row in rows])
+    header_row = header_row + [None] * (width - len(header_row))
+    rows = [row + [None] * (width - len(row)) for row in rows]
+    return {name: column_array([row[i] for row in rows]) for i, name in enumerate(unique_headers(header_row))}
+
+
+def load_entry(entry_dir: str) -> XlsxColumns | None:
+    """Memory-mapped columns of a cache entry, or None when it is missing or incomplete."""
+    try:
+        with open(os.path.join(entry_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != CACHE_VERSION:
+            return None
+        objects: Dict[str, list] = {}
+        if meta["object_columns"]:
+            with open(os.path.join(entry_dir, OBJECTS_FILE), "r", encoding="utf-8") as f:
+                objects = json.load(f)
+        columns: XlsxColumns = {}
+        for i, name in enumerate(meta["columns"]):
+            if str(i) in objects:
+                columns[name] = np.array(objects[str(i)], dtype=object)
+            else:
+                columns[name] = np.load(os.path.join(entry_dir, f"{i}.npy"), mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        return None
+    # Touch the entry: pruning removes the least recently used ones first.
+    try:
+        os.utime(os.path.join(entry_dir, META_FILE))
+    except OSError:
+        pass
+    return columns
+
+
+def json_safe(values: Sequence[object]) -> bool:
+    """True when json.load gives back the same cells (str, numbers, bool, NaN)."""
+    return all(isinstance(value, (str, int, float, bool)) for value in values)
+
+
+def write_entry(
+    cache_dir: str,
+    entry_dir: str,
+    source_path: str,
+    columns: XlsxColumns,
+    active_sheet: bool = True,
+) -> None:
+    """
+    Numeric, bool and datetime columns are saved as .npy, the others in one
+    JSON file keyed by column position. Workbooks with cells or headers JSON
+    cannot keep (times, dates among text) are not cached and are parsed on
+    every read.
+    """
+    if not json_safe(list(columns)):
+        return
+    if not all(json_safe(values.tolist()) for values in columns.values() if values.dtype == object):
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp_", dir=cache_dir)
+    try:
+        objects = {}
+        for i, (name, values) in enumerate(columns.items()):
+            if values.dtype == object:
+                objects[str(i)] = values.tolist()
+            else:
+                np.save(os.path.join(tmp_dir, f"{i}.npy"), values)
+        if objects:
+            with open(os.path.join(tmp_dir, OBJECTS_FILE), "w", encoding="utf-8") as f:
+                json.dump(objects, f, ensure_ascii=False)
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            meta = {
+                "version": CACHE_VERSION,
+                "source": os.path.abspath(source_path),
+                "sheet": "active" if active_sheet else "first",
+                "columns": list(columns),
+                "object_columns": [int(i) for i in objects],
+            }
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        # Another process wrote the same entry first, or the cache is not writable.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def entry_size(entry_dir: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+
+
+def prune_cache(cache_dir: str, max_bytes: int, keep: str = "") -> List[str]:
+    """
+    Remove entries of older versions of a source workbook (same sheet), then
+    the least recently used entries until the cache fits in max_bytes. keep is
+    never removed.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not entry.is_dir() or entry.name.startswith(".tmp_"):
+            continue
+        meta_path = os.path.join(entry.path, META_FILE)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            source = (meta.get("source"), meta.get("sheet"))
+            entries.append((os.path.getmtime(meta_path), entry.path, source, entry_size(entry.path)))
+        except (OSError, ValueError):
+            continue
+
+    keep_source = next((source for _, path, source, _ in entries if path == keep), None)
+    removed: List[str] = []
+    total = 0
+    for used, path, source, size in sorted(entries, reverse=True):
+        stale = keep_source is not None and source == keep_source
+        if path != keep and (stale or total + size > max_bytes):
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+        else:
+            total += size
+    return removed
+
+
+def read_xlsx_columns(xlsx_path: str, use_cache: bool = True, active_sheet: bool = True) -> XlsxColumns:
+    """
+    Columns of the active worksheet, see parse_xlsx_columns. The parsed columns are kept in the shared
+    cache and later reads of the unchanged file memory-map them instead of
+    parsing the workbook again. Cached numeric columns are read-only.
+    """
+    if not use_cache:
+        return parse_xlsx_columns(xlsx_path, active_sheet)
+    cache_dir = xlsx_cache_dir()
+    entry_dir = os.path.join(cache_dir, entry_key(xlsx_path, os.stat(xlsx_path), active_sheet))
+    columns = load_entry(entry_dir)
+    if columns is not None:
+        return columns
+
+    columns = parse_xlsx_columns(xlsx_path, active_sheet)
+    write_entry(cache_dir, entry_dir, xlsx_path, columns, active_sheet)
+    if os.path.isdir(entry_dir):
+        prune_cache(cache_dir, xlsx_cache_max_bytes(), keep=entry_dir)
+    return columns
+
+
+def read_excel_cached(xlsx_path: str):
+    """pandas.read_excel(xlsx_path) through the column cache; .xls and other formats are read directly."""
+    import pandas as pd
+
+    if not str(xlsx_path).lower().endswith(CACHED_EXTENSIONS):
+        return pd.read_excel(xlsx_path)
+    # read_excel reads the first worksheet, whichever one is active.
+    return pd.DataFrame(read_xlsx_columns(str(xlsx_path), active_sheet=False))